@@ -0,0 +1,36 @@
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Campaign, Client, Station, MediaAnalystProfile
+
+# group_by option -> (model, label lookup, path from that model to Assignment)
+ANALYSIS_GROUPS = {
+    'campaign': (Campaign, 'name', 'assignments'),
+    'client': (Client, 'name', 'campaigns__assignments'),
+    'station': (Station, 'name', 'assignments'),
+    'analyst': (MediaAnalystProfile, 'user__username', 'assignments'),
+}
+ANALYSIS_FIELDS = ['planned', 'missed', 'transmitted', 'share']
+
+
+def spot_totals(group_by='campaign'):
+    """
+    Planned/missed/transmitted spot totals and transmission share per group.
+    Each grouping runs as a single aggregated query.
+    """
+    model, label, path = ANALYSIS_GROUPS[group_by]
+    rows = model.objects.annotate(
+        planned=Coalesce(Sum(f'{path}__planned_spots'), Value(0)),
+        missed=Coalesce(Sum(f'{path}__missed_spots'), Value(0)),
+        transmitted=Coalesce(Sum(f'{path}__transmitted_spots'), Value(0)),
+    ).order_by('pk').values_list(label, 'planned', 'missed', 'transmitted')
+    analysis = []
+    for name, planned, missed, transmitted in rows:
+        analysis.append({
+            group_by: name,
+            'planned': planned,
+            'missed': missed,
+            'transmitted': transmitted,
+            'share': f"{(transmitted / planned * 100) if planned else 0:.1f}%",
+        })
+    return analysis
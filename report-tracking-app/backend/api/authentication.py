@@ -0,0 +1,150 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+TOKEN_CACHE_DEFAULTS = {
+    'MAXSIZE': 10000,
+    # Seconds a token stays valid in this process; bounds how long a revocation made in
+    # another process can go unnoticed here
+    'TTL': 60,
+    # Optional Django cache alias shared by all processes, checked on a local miss
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+}
+
+
+def token_cache_settings():
+    return {**TOKEN_CACHE_DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+class TokenCache:
+    """Thread-safe LRU of token key -> user with a per-entry TTL, plus hit/miss counters."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, user):
+        with self.lock:
+            self.entries[key] = (user, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+            }
+
+
+_config = token_cache_settings()
+TOKEN_CACHE = TokenCache(_config['MAXSIZE'], _config['TTL'])
+
+
+def shared_token_cache():
+    alias = token_cache_settings()['SHARED_CACHE']
+    return caches[alias] if alias else None
+
+
+def shared_cache_key(key):
+    return f'auth:token:{key}'
+
+
+def revoke_token(key):
+    """Forget a token in this process and in the shared cache."""
+    TOKEN_CACHE.pop(key)
+    shared = shared_token_cache()
+    if shared is not None:
+        shared.delete(shared_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that serves repeat requests from TOKEN_CACHE (and the shared cache
+    when TOKEN_AUTH_CACHE['SHARED_CACHE'] is set) instead of querying authtoken_token and auth_user.
+    Entries are revoked by signals in api.signals when a token is deleted or its user is saved.
+    """
+
+    def authenticate_credentials(self, key):
+        user = TOKEN_CACHE.get(key)
+        if user is None:
+            shared = shared_token_cache()
+            user = shared.get(shared_cache_key(key)) if shared is not None else None
+            if user is None:
+                user, token = super().authenticate_credentials(key)
+                if shared is not None:
+                    shared.set(shared_cache_key(key), user, token_cache_settings()['SHARED_TTL'])
+            TOKEN_CACHE.set(key, user)
+        # Each request gets its own copy, so per-request state (e.g. cached roles) never leaks
+        user = copy.copy(user)
+        user.__dict__.pop('_group_names', None)
+        return user, Token(key=key, user=user)
+
+
+@database_sync_to_async
+def get_token_user(key):
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return AnonymousUser()
+    return user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Sets scope['user'] for WebSocket connections from the DRF auth token.
+    Browsers cannot set headers on a WebSocket, so ?token= is accepted as well as
+    an "Authorization: Token <key>" header.
+    """
+
+    async def __call__(self, scope, receive, send):
+        key = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+        if key is None:
+            header = dict(scope.get('headers', [])).get(b'authorization', b'').decode()
+            if header.startswith('Token '):
+                key = header[len('Token '):].strip()
+        scope['user'] = await get_token_user(key) if key else AnonymousUser()
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,198 @@
+import ast
+import json
+import time
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.models.signals import post_save, pre_save
+
+from .caching import bump_version
+from .models import Station, Client, Campaign, Assignment, MediaAnalystProfile
+
+# section name -> (model, columns written for an existing row; None means every concrete column)
+IMPORT_SECTIONS = {
+    'users': (User, ['username', 'email', 'is_active']),
+    'stations': (Station, None),
+    'clients': (Client, None),
+    'campaigns': (Campaign, None),
+    'analysts': (MediaAnalystProfile, None),
+    'assignments': (Assignment, None),
+}
+IMPORT_BATCH_SIZE = 1000
+
+
+class EntityImportError(ValueError):
+    pass
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def parse_literal(value):
+    """Decode a list/dict cell written as JSON (or as a Python repr by older CSV exports)."""
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+class BulkEntityImporter:
+    """
+    Imports (section, row) records with one bulk upsert per batch and one transaction per section.
+    bulk_create sends no model signals; unless suppress_signals is set, pre_save and post_save are
+    sent for every imported row around it so profile creation and notifications still happen.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, suppress_signals=False):
+        self.batch_size = batch_size
+        self.suppress_signals = suppress_signals
+        self.imported = {}
+        self.timing = {}
+
+    def run(self, records):
+        started = time.perf_counter()
+        # Consecutive rows of the same section form one unit of work
+        for section, rows in groupby(records, key=itemgetter(0)):
+            if section not in IMPORT_SECTIONS:
+                continue
+            self.import_section(section, (row for _, row in rows))
+        elapsed = time.perf_counter() - started
+        total = sum(self.imported.values())
+        return {
+            'imported': self.imported,
+            'timing': {section: round(seconds, 3) for section, seconds in self.timing.items()},
+            'elapsed': round(elapsed, 3),
+            'rows_per_second': round(total / elapsed, 1) if elapsed else total,
+        }
+
+    def import_section(self, section, rows):
+        model, update_fields = IMPORT_SECTIONS[section]
+        concrete = [f for f in model._meta.concrete_fields if not f.primary_key]
+        if update_fields is None:
+            # Keep the original creation timestamps of rows that already exist
+            update_fields = [f.name for f in concrete if not getattr(f, 'auto_now_add', False)]
+        columns = {}
+        for field in concrete:
+            if field.name in update_fields or getattr(field, 'auto_now_add', False):
+                columns[field.name] = field
+                columns[field.attname] = field
+        many_to_many = {f.name: f for f in model._meta.many_to_many}
+        started = time.perf_counter()
+        count = 0
+        with transaction.atomic():
+            for batch in batched(rows, self.batch_size):
+                objs, relations = self.build_objects(section, model, columns, many_to_many, batch)
+                # Only overwrite columns the upload actually carries
+                present = {columns[key].name for row in batch for key in row if key in columns}
+                batch_update_fields = [name for name in update_fields if name in present]
+                stamped = [f for f in concrete if getattr(f, 'auto_now_add', False) and f.name in present]
+                existing = {}
+                if not self.suppress_signals:
+                    existing = self.send_pre_save(model, objs)
+                elif stamped:
+                    existing = set(model.objects.filter(pk__in=[obj.pk for obj in objs]).values_list('pk', flat=True))
+                # bulk_create stamps auto_now_add columns with the current time
+                stamps = [(obj, [(f.attname, getattr(obj, f.attname)) for f in stamped]) for obj in objs if obj.pk not in existing]
+                if batch_update_fields:
+                    model.objects.bulk_create(objs, update_conflicts=True, unique_fields=['id'], update_fields=batch_update_fields)
+                else:
+                    model.objects.bulk_create(objs, ignore_conflicts=True)
+                if stamped:
+                    self.restore_creation_times(model, stamped, stamps)
+                for field, values in relations.items():
+                    self.replace_relations(field, values)
+                if not self.suppress_signals:
+                    for obj in objs:
+                        post_save.send(sender=model, instance=obj, created=obj.pk not in existing,
+                                       update_fields=None, raw=False, using=obj._state.db)
+                count += len(objs)
+            # Rows were inserted with explicit ids, so move the id sequence past them
+            reset_sequences(model)
+        # bulk_create bypasses the signals that expire cached responses
+        bump_version(model)
+        self.imported[section] = self.imported.get(section, 0) + count
+        self.timing[section] = self.timing.get(section, 0) + time.perf_counter() - started
+
+    def restore_creation_times(self, model, fields, stamps):
+        # Inserted rows get the creation times of the backup back with one UPDATE per batch
+        restored = []
+        for obj, values in stamps:
+            values = [(attname, value) for attname, value in values if value is not None]
+            for attname, value in values:
+                setattr(obj, attname, value)
+            if values:
+                restored.append(obj)
+        model.objects.bulk_update(restored, [f.name for f in fields], batch_size=self.batch_size)
+
+    def send_pre_save(self, model, objs):
+        """
+        Send pre_save for a batch, with the stored values of tracked fields loaded in the same
+        query that finds existing rows, so handlers see an unchanged status as unchanged.
+        Returns {pk: stored values} for the rows that already exist.
+        """
+        tracked = getattr(model, 'tracked_fields', ())
+        existing = {row['pk']: row for row in model.objects.filter(pk__in=[obj.pk for obj in objs]).values('pk', *tracked)}
+        for obj in objs:
+            if obj.pk in existing:
+                obj._state.adding = False
+                obj._persisted = {name: existing[obj.pk][name] for name in tracked}
+            pre_save.send(sender=model, instance=obj, raw=False, using=connection.alias, update_fields=None)
+        return existing
+
+    def build_objects(self, section, model, columns, many_to_many, rows):
+        objs = []
+        relations = {}
+        for row in rows:
+            if row.get('id') in (None, ''):
+                raise EntityImportError(f"Row without id in section '{section}'.")
+            obj = model(pk=model._meta.pk.to_python(row['id']))
+            for key, value in row.items():
+                if key in many_to_many:
+                    relations.setdefault(many_to_many[key], {})[obj.pk] = parse_literal(value) or []
+                    continue
+                field = columns.get(key)
+                if field is not None:
+                    setattr(obj, field.attname, to_python(field, value))
+            objs.append(obj)
+        return objs, relations
+
+    def replace_relations(self, field, values):
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        through.objects.filter(**{f'{source}_id__in': list(values)}).delete()
+        through.objects.bulk_create([
+            through(**{f'{source}_id': pk, f'{target}_id': int(related)})
+            for pk, related_ids in values.items() for related in related_ids
+        ])
+
+
+def to_python(field, value):
+    # CSV cells are always strings, so an empty cell means "no value"
+    if value == '' and field.null:
+        return None
+    if isinstance(field, models.JSONField):
+        return parse_literal(value)
+    if isinstance(field, models.ForeignKey):
+        return field.target_field.to_python(value)
+    return field.to_python(value)
+
+
+def reset_sequences(model):
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
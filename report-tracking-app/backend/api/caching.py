@@ -0,0 +1,87 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .roles import frontend_role
+
+# Reference data responses are cached under a key that includes a version counter for every
+# model they are built from. Signals in api.signals bump a model's counter on any change, so
+# stale entries are never read again and simply expire. Counters live in the default cache,
+# which must be shared (Redis) when several processes serve the API.
+RESPONSE_CACHE_TIMEOUT = 600
+
+
+def version_key(model):
+    return f'cache_version:{model._meta.label_lower}'
+
+
+def model_versions(models):
+    """Current version of each model, in order; one cache round trip."""
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock so a lost counter never repeats a version seen before
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    key = version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+class CachedResponseMixin:
+    """
+    Serves list/retrieve from the response cache, keyed by path, query string, the caller's
+    role and the versions of `cache_models`. The ETag is derived from that key, so a matching
+    If-None-Match is answered with 304 before the cache, the database or a serializer is touched.
+    """
+    cache_models = ()
+    cache_timeout = RESPONSE_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
+
+    def response_cache_key(self, request):
+        versions = model_versions(self.cache_models or [self.get_queryset().model])
+        query = sorted(request.query_params.lists())
+        role = frontend_role(request.user) if request.user.is_authenticated else 'anonymous'
+        raw = repr((request.path, query, role, versions))
+        return 'response:' + hashlib.sha256(raw.encode()).hexdigest()
+
+    def cached_response(self, request, render):
+        key = self.response_cache_key(request)
+        etag = f'"{key[-32:]}"'
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get(key)
+            if data is None:
+                response = render()
+                if response.status_code == status.HTTP_200_OK:
+                    cache.set(key, response.data, self.cache_timeout)
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        # Clients may keep the body but must revalidate it
+        response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,71 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+def user_group(user_id):
+    return f'user_{user_id}'
+
+
+class UserEventsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    One socket per signed-in client at ws/events/?token=<auth token>.
+    Pushes {"type": "notification" | "message", "data": {...}} as rows are created,
+    in the same shape the REST endpoints return them.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.group_name = user_group(user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Lets clients keep idle connections alive through proxies
+        if content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def notification_created(self, event):
+        await self.send_json({'type': 'notification', 'data': event['data']})
+
+    async def message_created(self, event):
+        await self.send_json({'type': 'message', 'data': event['data']})
+
+
+def push(user_ids, event_type, data):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    send = async_to_sync(channel_layer.group_send)
+    # Pushing is best effort: the row is already committed and clients still poll the REST
+    # endpoints, so an unreachable channel layer must not fail the request or the dispatcher
+    try:
+        for user_id in dict.fromkeys(user_ids):
+            send(user_group(user_id), {'type': event_type, 'data': data})
+    except Exception:
+        logger.exception(f"[push] {event_type} could not be sent to the channel layer")
+
+
+def push_notifications(notifications):
+    # Serializer imported here: serializers -> workflow -> notifications -> this module
+    from .serializers import NotificationSerializer
+    for notification in notifications:
+        push([notification.user_id], 'notification.created', dict(NotificationSerializer(notification).data))
+
+
+def push_message(message):
+    from .serializers import MessageSerializer
+    data = dict(MessageSerializer(message).data)
+    # The sender's other open tabs see the message too
+    push([message.recipient_id, message.sender_id], 'message.created', data)
@@ -0,0 +1,103 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+
+# Sparse fieldsets: GET ?fields=id,name returns only those fields, ?omit=contacts,memo drops
+# fields. Unknown names are ignored. The view mixin trims the query to the same columns.
+
+
+def requested_fields(request):
+    """(fields, omit) name sets from the query string; None when not given or not a read."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, None
+
+    def parse(param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    return parse('fields'), parse('omit')
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Drops the fields a read request did not ask for. Fields added in to_representation are
+    listed in Meta.extra_fields; `selected_extra_fields` holds the ones still wanted.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        include, omit = requested_fields(self.context.get('request'))
+        self.selected_extra_fields = set(getattr(self.Meta, 'extra_fields', ()))
+        if include is None and omit is None:
+            return
+
+        def wanted(name):
+            return (include is None or name in include) and not (omit and name in omit)
+
+        for name in list(self.fields):
+            if not wanted(name):
+                self.fields.pop(name)
+        self.selected_extra_fields = {name for name in self.selected_extra_fields if wanted(name)}
+
+    def model_field_names(self):
+        """Model fields the remaining serializer fields read; None if that cannot be told."""
+        names = set()
+        for field in self.fields.values():
+            if field.write_only:
+                continue
+            if field.source == '*':
+                return None
+            names.add(field.source.split('.')[0])
+        return names
+
+
+def select_related_paths(tree, prefix=''):
+    for name, children in tree.items():
+        path = f'{prefix}{name}'
+        yield path
+        yield from select_related_paths(children, f'{path}__')
+
+
+def sparse_queryset(queryset, names, ordering=()):
+    """queryset.only() the given model fields plus the pk and ordering columns."""
+    model = queryset.model
+    columns = {model._meta.pk.name}
+    for name in list(names) + [field.lstrip('-').split('__')[0] for field in ordering]:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # A property or method: it may read any column, so load them all
+            return queryset
+        if field.concrete and not field.many_to_many:
+            columns.add(field.name)
+    related = queryset.query.select_related
+    if related is True:
+        return queryset
+    if related:
+        # Joins for relations no longer loaded would conflict with only()
+        paths = [path for path in select_related_paths(related) if path.split('__')[0] in columns]
+        queryset = queryset.select_related(None)
+        if paths:
+            queryset = queryset.select_related(*paths)
+    return queryset.only(*columns)
+
+
+class SparseFieldsViewMixin:
+    """
+    Limits list/retrieve queries to the columns the sparse serializer will read. Hooks
+    filter_queryset, so viewsets that override get_queryset are trimmed too.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        include, omit = requested_fields(self.request)
+        if include is None and omit is None:
+            return queryset
+        names = self.get_serializer().model_field_names()
+        if names is None:
+            return queryset
+        ordering = list(queryset.query.order_by)
+        paginator_ordering = getattr(self.paginator, 'ordering', None) or ()
+        ordering += [paginator_ordering] if isinstance(paginator_ordering, str) else list(paginator_ordering)
+        return sparse_queryset(queryset, names, ordering)
@@ -8,75 +8,118 @@ from rest_framework.permissions import IsAdminUser
 def test_import_export(request):
     return JsonResponse({'status': 'ok', 'msg': 'import_export.py loaded'})
 
+CAMPAIGN_EXECUTION_FIELDS = [
+    'Client Name', 'Campaign Name', 'Campaign Status', 'Campaign Start Date', 'Campaign End Date',
+    'Assignment ID', 'Assignment Status', 'Planned Spots', 'Transmitted Spots', 'Missed Spots', 'Gained Spots',
+    'Station Name', 'Analyst Name', 'Analyst Username', 'Assignment Start Date', 'Assignment End Date'
+]
+# Rows fetched per database round trip when streaming
+STREAM_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() hands the value back, so csv.writer can feed a generator."""
+    def write(self, value):
+        return value
+
+
+def campaign_execution_row(a):
+    return {
+        'Client Name': a.campaign.client.name if a.campaign and a.campaign.client else '',
+        'Campaign Name': a.campaign.name if a.campaign else '',
+        'Campaign Status': a.campaign.status if a.campaign else '',
+        'Campaign Start Date': a.campaign.created_at.strftime('%Y-%m-%d') if a.campaign and a.campaign.created_at else '',
+        'Campaign End Date': '',  # Add if you have end date field
+        'Assignment ID': a.id,
+        'Assignment Status': a.status,
+        'Planned Spots': a.planned_spots,
+        'Transmitted Spots': a.transmitted_spots,
+        'Missed Spots': a.missed_spots,
+        'Gained Spots': a.gain_spots,
+        'Station Name': a.station.name if a.station else '',
+        'Analyst Name': a.analyst.user.get_full_name() if a.analyst and a.analyst.user else '',
+        'Analyst Username': a.analyst.user.username if a.analyst and a.analyst.user else '',
+        'Assignment Start Date': a.assigned_at.strftime('%Y-%m-%d') if a.assigned_at else '',
+        'Assignment End Date': a.submitted_at.strftime('%Y-%m-%d') if a.submitted_at else '',
+    }
+
+
+def stream_campaign_execution_csv(assignments, chunk_size=STREAM_CHUNK_SIZE):
+    writer = csv.DictWriter(Echo(), fieldnames=CAMPAIGN_EXECUTION_FIELDS)
+    yield writer.writeheader()
+    for a in assignments.iterator(chunk_size=chunk_size):
+        yield writer.writerow(campaign_execution_row(a))
+
+
+def stream_campaign_execution_ndjson(assignments, chunk_size=STREAM_CHUNK_SIZE):
+    for a in assignments.iterator(chunk_size=chunk_size):
+        yield dumps(campaign_execution_row(a)) + b'\n'
+
+
+def stream_campaign_execution_json(assignments, chunk_size=STREAM_CHUNK_SIZE):
+    separator = b'['
+    for a in assignments.iterator(chunk_size=chunk_size):
+        yield separator + dumps(campaign_execution_row(a))
+        separator = b','
+    yield b']' if separator == b',' else b'[]'
+
+
+CAMPAIGN_EXECUTION_FORMATS = {
+    'csv': (stream_campaign_execution_csv, 'text/csv'),
+    'json': (stream_campaign_execution_json, 'application/json'),
+    'ndjson': (stream_campaign_execution_ndjson, 'application/x-ndjson'),
+}
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def export_campaign_execution(request):
     """
-    Export campaign execution data filtered by client(s).
+    Export campaign execution data filtered by client(s), streamed as rows are read.
     Query params:
       - client_id: single or comma-separated list of client IDs
-      - format: csv (default) or json
+      - format: csv (default), json or ndjson
+      - chunk_size: rows fetched per database round trip
     """
     client_ids = request.GET.get('client_id', '')
     fmt = request.GET.get('format', 'csv')
+    if fmt not in CAMPAIGN_EXECUTION_FORMATS:
+        return JsonResponse({'error': f"format must be one of: {', '.join(CAMPAIGN_EXECUTION_FORMATS)}."}, status=400)
+    try:
+        chunk_size = max(int(request.GET.get('chunk_size', STREAM_CHUNK_SIZE)), 1)
+    except ValueError:
+        return JsonResponse({'error': 'chunk_size must be an integer.'}, status=400)
     if client_ids:
         client_ids = [int(cid) for cid in client_ids.split(',') if cid.strip().isdigit()]
         campaigns = Campaign.objects.filter(client_id__in=client_ids)
     else:
         campaigns = Campaign.objects.all()
-    assignments = Assignment.objects.filter(campaign__in=campaigns).select_related('campaign', 'station', 'analyst', 'analyst__user', 'campaign__client')
-    # Compose rows
-    rows = []
-    for a in assignments:
-        rows.append({
-            'Client Name': a.campaign.client.name if a.campaign and a.campaign.client else '',
-            'Campaign Name': a.campaign.name if a.campaign else '',
-            'Campaign Status': a.campaign.status if a.campaign else '',
-            'Campaign Start Date': a.campaign.created_at.strftime('%Y-%m-%d') if a.campaign and a.campaign.created_at else '',
-            'Campaign End Date': '',  # Add if you have end date field
-            'Assignment ID': a.id,
-            'Assignment Status': a.status,
-            'Planned Spots': a.planned_spots,
-            'Transmitted Spots': a.transmitted_spots,
-            'Missed Spots': a.missed_spots,
-            'Gained Spots': a.gain_spots,
-            'Station Name': a.station.name if a.station else '',
-            'Analyst Name': a.analyst.user.get_full_name() if a.analyst and a.analyst.user else '',
-            'Analyst Username': a.analyst.user.username if a.analyst and a.analyst.user else '',
-            'Assignment Start Date': a.assigned_at.strftime('%Y-%m-%d') if a.assigned_at else '',
-            'Assignment End Date': a.submitted_at.strftime('%Y-%m-%d') if a.submitted_at else '',
-        })
+    assignments = Assignment.objects.filter(campaign__in=campaigns).select_related(
+        'campaign', 'station', 'analyst', 'analyst__user', 'campaign__client'
+    ).order_by('id')
     filename = export_filename('campaign_execution', fmt)
-    if fmt == 'json':
-        response = HttpResponse(json.dumps(rows, indent=2), content_type='application/json')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
-    else:
-        # CSV
-        output = io.StringIO()
-        fieldnames = [
-            'Client Name', 'Campaign Name', 'Campaign Status', 'Campaign Start Date', 'Campaign End Date',
-            'Assignment ID', 'Assignment Status', 'Planned Spots', 'Transmitted Spots', 'Missed Spots', 'Gained Spots',
-            'Station Name', 'Analyst Name', 'Analyst Username', 'Assignment Start Date', 'Assignment End Date'
-        ]
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(row)
-        response = HttpResponse(output.getvalue(), content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+    # Rows are built and sent one chunk at a time, so memory stays flat regardless of table size
+    stream, content_type = CAMPAIGN_EXECUTION_FORMATS[fmt]
+    response = StreamingHttpResponse(stream(assignments, chunk_size), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 import csv
 import io
-import json
-from django.http import HttpResponse, JsonResponse
-from .utils import export_filename
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+from .utils import export_filename, is_truthy
+from .renderers import dumps
+from .bulk_import import BulkEntityImporter, IMPORT_BATCH_SIZE, batched
+from .import_parsers import IMPORT_PARSERS
+from .analysis import ANALYSIS_GROUPS, ANALYSIS_FIELDS, spot_totals
 from .models import Station, Client, Campaign, Assignment, MediaAnalystProfile
 from django.contrib.auth.models import User
-from .serializers import StationSerializer, ClientSerializer, CampaignSerializer, AssignmentSerializer
 
 # --- SETTINGS DATA ---
 @api_view(['GET'])
@@ -98,7 +141,7 @@ def export_settings(request):
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
     else:
-        response = HttpResponse(json.dumps(settings_data, indent=2), content_type='application/json')
+        response = HttpResponse(dumps(settings_data), content_type='application/json')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
@@ -110,176 +153,178 @@ def import_settings(request):
     return JsonResponse({'status': 'Settings import not implemented for safety.'}, status=400)
 
 # --- MODULES & USER DATA ---
+def analyst_full_name(path):
+    # User.get_full_name() falling back to the username, computed in the export query
+    full_name = Trim(Concat(f'{path}__first_name', Value(' '), f'{path}__last_name'))
+    return Coalesce(NullIf(full_name, Value('')), f'{path}__username')
+
+
+def concrete_columns(model):
+    return [f.name for f in model._meta.concrete_fields]
+
+
+def entity_sections():
+    """
+    (section, model, values() columns, annotated columns, many-to-many columns) in restore order.
+    Keys match the serializer output the export used to write, which import_entities reads back.
+    """
+    return [
+        ('users', User, ['id', 'username', 'email', 'is_active'], {}, []),
+        ('stations', Station, concrete_columns(Station), {}, []),
+        ('clients', Client, concrete_columns(Client), {}, []),
+        ('campaigns', Campaign, concrete_columns(Campaign), {'client_name': F('client__name')}, ['stations']),
+        # Analysts precede assignments so a section-by-section restore never references missing rows
+        ('analysts', MediaAnalystProfile, ['id', 'user_id'], {}, []),
+        ('assignments', Assignment, concrete_columns(Assignment), {
+            'analyst_user': F('analyst__user__username'),
+            'analyst_user_id': F('analyst__user_id'),
+            'analyst_user_full_name': analyst_full_name('analyst__user'),
+        }, []),
+    ]
+
+
+def attach_many_to_many(model, name, rows):
+    # One IN query per batch, the values() counterpart of prefetch_related
+    field = model._meta.get_field(name)
+    through = field.remote_field.through
+    source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+    related = {row['id']: [] for row in rows}
+    pairs = through.objects.filter(**{f'{source}_id__in': list(related)}).order_by(f'{target}_id')
+    for pk, related_pk in pairs.values_list(f'{source}_id', f'{target}_id'):
+        related[pk].append(related_pk)
+    for row in rows:
+        row[name] = related[row['id']]
+
+
+def iter_entity_batches(model, columns, annotations, many_to_many, chunk_size):
+    """Rows of one section, chunk_size at a time, read with a single values() iterator."""
+    # Decimals are written as strings, like the serializers, so backups keep every digit
+    decimals = [f.name for f in model._meta.concrete_fields if isinstance(f, DecimalField) and f.name in columns]
+    rows = model.objects.values(*columns, **annotations).order_by('pk').iterator(chunk_size=chunk_size)
+    for batch in batched(rows, chunk_size):
+        for name in many_to_many:
+            attach_many_to_many(model, name, batch)
+        for row in batch:
+            for name in decimals:
+                if row[name] is not None:
+                    row[name] = str(row[name])
+        yield batch
+
+
+def stream_entities_json(sections, chunk_size=STREAM_CHUNK_SIZE):
+    # {"section": [row, ...], ...} written a batch at a time
+    yield b'{'
+    for index, (name, model, columns, annotations, many_to_many) in enumerate(sections):
+        yield (b',' if index else b'') + dumps(name) + b':['
+        separator = b''
+        for batch in iter_entity_batches(model, columns, annotations, many_to_many, chunk_size):
+            yield separator + b','.join(dumps(row) for row in batch)
+            separator = b','
+        yield b']'
+    yield b'}'
+
+
+def stream_entities_ndjson(sections, chunk_size=STREAM_CHUNK_SIZE):
+    for name, model, columns, annotations, many_to_many in sections:
+        for batch in iter_entity_batches(model, columns, annotations, many_to_many, chunk_size):
+            yield b''.join(dumps({'section': name, 'data': row}) + b'\n' for row in batch)
+
+
+def stream_entities_csv(sections, chunk_size=STREAM_CHUNK_SIZE):
+    # A [SECTION] row, a header row, the data rows and a blank row per section
+    writer = csv.writer(Echo())
+    for name, model, columns, annotations, many_to_many in sections:
+        header = [*columns, *annotations, *many_to_many]
+        yield writer.writerow([f'[{name.upper()}]'])
+        yield writer.writerow(header)
+        for batch in iter_entity_batches(model, columns, annotations, many_to_many, chunk_size):
+            # Lists and objects (contacts, stations) are written as JSON
+            yield ''.join(
+                writer.writerow([dumps(row[c]).decode() if isinstance(row[c], (list, dict)) else row[c] for c in header])
+                for row in batch
+            )
+        yield writer.writerow([])
+
+
+ENTITY_EXPORT_FORMATS = {
+    'json': (stream_entities_json, 'application/json'),
+    'ndjson': (stream_entities_ndjson, 'application/x-ndjson'),
+    'csv': (stream_entities_csv, 'text/csv'),
+}
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def export_entities(request):
+    """
+    Full entity backup, streamed section by section so memory stays flat however large the tables are.
+    Each section is one values() query (campaigns add one query per chunk for their stations).
+    Query params:
+      - format: json (default), csv or ndjson
+      - chunk_size: rows fetched per database round trip
+    """
     fmt = request.GET.get('format', 'json')
-    models = [
-        ('users', User, ['id', 'username', 'email', 'is_active']),
-        ('stations', Station, StationSerializer),
-        ('clients', Client, ClientSerializer),
-        ('campaigns', Campaign, CampaignSerializer),
-        ('assignments', Assignment, AssignmentSerializer),
-        ('analysts', MediaAnalystProfile, ['id', 'user_id']),
-    ]
+    if fmt not in ENTITY_EXPORT_FORMATS:
+        return JsonResponse({'error': f"format must be one of: {', '.join(ENTITY_EXPORT_FORMATS)}."}, status=400)
+    try:
+        chunk_size = max(int(request.GET.get('chunk_size', STREAM_CHUNK_SIZE)), 1)
+    except ValueError:
+        return JsonResponse({'error': 'chunk_size must be an integer.'}, status=400)
+    stream, content_type = ENTITY_EXPORT_FORMATS[fmt]
     filename = export_filename('entities', fmt)
-    if fmt == 'csv':
-        output = io.StringIO()
-        writer = csv.writer(output)
-        for name, model, serializer in models:
-            writer.writerow([f'[{name.upper()}]'])
-            if isinstance(serializer, list):
-                writer.writerow(serializer)
-                for obj in model.objects.all():
-                    writer.writerow([getattr(obj, f, '') for f in serializer])
-            else:
-                # Use DRF serializer for JSON fields
-                fields = serializer.Meta.fields if hasattr(serializer.Meta, 'fields') else []
-                writer.writerow(fields)
-                for obj in model.objects.all():
-                    row = serializer(obj).data
-                    writer.writerow([row.get(f, '') for f in fields])
-            writer.writerow([])
-        response = HttpResponse(output.getvalue(), content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
-    else:
-        # JSON export
-        data = {}
-        for name, model, serializer in models:
-            if isinstance(serializer, list):
-                data[name] = list(model.objects.values(*serializer))
-            else:
-                data[name] = serializer(model.objects.all(), many=True).data
-        response = HttpResponse(json.dumps(data, indent=2), content_type='application/json')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+    response = StreamingHttpResponse(stream(entity_sections(), chunk_size), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def import_entities(request):
-    # Accept JSON or CSV upload, parse and create/update records
+    """
+    Restore entities from a JSON, CSV or NDJSON export, one bulk upsert per batch and one transaction per section.
+    Form fields:
+      - file: .json, .csv or .ndjson/.jsonl upload (NDJSON lines: {"section": ..., "data": {...}})
+      - suppress_signals: 1/true to skip model signals (profiles, notifications) during restore
+      - batch_size: rows written per bulk statement
+    """
     file = request.FILES.get('file')
     if not file:
         return JsonResponse({'error': 'No file uploaded.'}, status=400)
     fmt = file.name.split('.')[-1].lower()
-    results = {}
-    if fmt == 'json':
-        try:
-            data = json.load(file)
-        except Exception as e:
-            return JsonResponse({'error': f'Invalid JSON: {e}'}, status=400)
-        # Import users
-        if 'users' in data:
-            for u in data['users']:
-                User.objects.update_or_create(id=u['id'], defaults={
-                    'username': u['username'],
-                    'email': u.get('email', ''),
-                    'is_active': u.get('is_active', True),
-                })
-            results['users'] = len(data['users'])
-        # Import stations
-        if 'stations' in data:
-            for s in data['stations']:
-                Station.objects.update_or_create(id=s['id'], defaults=s)
-            results['stations'] = len(data['stations'])
-        # Import clients
-        if 'clients' in data:
-            for c in data['clients']:
-                Client.objects.update_or_create(id=c['id'], defaults=c)
-            results['clients'] = len(data['clients'])
-        # Import campaigns
-        if 'campaigns' in data:
-            for c in data['campaigns']:
-                Campaign.objects.update_or_create(id=c['id'], defaults=c)
-            results['campaigns'] = len(data['campaigns'])
-        # Import assignments
-        if 'assignments' in data:
-            for a in data['assignments']:
-                Assignment.objects.update_or_create(id=a['id'], defaults=a)
-            results['assignments'] = len(data['assignments'])
-        # Import analysts
-        if 'analysts' in data:
-            for a in data['analysts']:
-                MediaAnalystProfile.objects.update_or_create(id=a['id'], defaults=a)
-            results['analysts'] = len(data['analysts'])
-        return JsonResponse({'imported': results})
-    elif fmt == 'csv':
-        # CSV import: expects format as exported (section headers)
-        content = file.read().decode('utf-8')
-        reader = csv.reader(io.StringIO(content))
-        current = None
-        headers = []
-        count = 0
-        for row in reader:
-            if not row or row[0].startswith('['):
-                if current and count:
-                    results[current] = count
-                current = row[0].strip('[]').lower() if row else None
-                headers = []
-                count = 0
-                continue
-            if not headers:
-                headers = row
-                continue
-            if current == 'users':
-                obj = dict(zip(headers, row))
-                User.objects.update_or_create(id=obj['id'], defaults={
-                    'username': obj['username'],
-                    'email': obj.get('email', ''),
-                    'is_active': obj.get('is_active', True),
-                })
-                count += 1
-            elif current == 'stations':
-                obj = dict(zip(headers, row))
-                Station.objects.update_or_create(id=obj['id'], defaults=obj)
-                count += 1
-            elif current == 'clients':
-                obj = dict(zip(headers, row))
-                Client.objects.update_or_create(id=obj['id'], defaults=obj)
-                count += 1
-            elif current == 'campaigns':
-                obj = dict(zip(headers, row))
-                Campaign.objects.update_or_create(id=obj['id'], defaults=obj)
-                count += 1
-            elif current == 'assignments':
-                obj = dict(zip(headers, row))
-                Assignment.objects.update_or_create(id=obj['id'], defaults=obj)
-                count += 1
-            elif current == 'analysts':
-                obj = dict(zip(headers, row))
-                MediaAnalystProfile.objects.update_or_create(id=obj['id'], defaults=obj)
-                count += 1
-        if current and count:
-            results[current] = count
-        return JsonResponse({'imported': results})
-    else:
+    try:
+        batch_size = max(int(request.data.get('batch_size', IMPORT_BATCH_SIZE)), 1)
+    except ValueError:
+        return JsonResponse({'error': 'batch_size must be an integer.'}, status=400)
+    if fmt not in IMPORT_PARSERS:
         return JsonResponse({'error': 'Unsupported file type.'}, status=400)
+    # The upload is parsed incrementally while the importer consumes it batch by batch
+    records = IMPORT_PARSERS[fmt](file)
+    importer = BulkEntityImporter(batch_size=batch_size, suppress_signals=is_truthy(request.data.get('suppress_signals')))
+    try:
+        report = importer.run(records)
+    except (ValueError, ValidationError, IntegrityError) as e:
+        # Sections finished before the failure stay committed
+        return JsonResponse({'error': f'Import failed: {e}', 'imported': importer.imported}, status=400)
+    return JsonResponse(report)
 
 # --- ANALYSIS DATA ---
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def export_analysis(request):
+    """
+    Spot totals and transmission share.
+    Query params:
+      - group_by: campaign (default), client, station or analyst
+      - format: json (default) or csv
+    """
     fmt = request.GET.get('format', 'json')
-    # Example: campaign status summary
-    campaigns = Campaign.objects.all()
-    analysis = []
-    for c in campaigns:
-        assignments = Assignment.objects.filter(campaign=c)
-        planned = sum(a.planned_spots or 0 for a in assignments)
-        missed = sum(a.missed_spots or 0 for a in assignments)
-        transmitted = sum(a.transmitted_spots or 0 for a in assignments)
-        analysis.append({
-            'campaign': c.name,
-            'planned': planned,
-            'missed': missed,
-            'transmitted': transmitted,
-            'share': f"{(transmitted / planned * 100) if planned else 0:.1f}%",
-        })
+    group_by = request.GET.get('group_by', 'campaign')
+    if group_by not in ANALYSIS_GROUPS:
+        return JsonResponse({'error': f"group_by must be one of: {', '.join(ANALYSIS_GROUPS)}."}, status=400)
+    analysis = spot_totals(group_by)
     filename = export_filename('analysis', fmt)
     if fmt == 'csv':
         output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=['campaign', 'planned', 'missed', 'transmitted', 'share'])
+        writer = csv.DictWriter(output, fieldnames=[group_by] + ANALYSIS_FIELDS)
         writer.writeheader()
         for row in analysis:
             writer.writerow(row)
@@ -287,7 +332,7 @@ def export_analysis(request):
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
     else:
-        response = HttpResponse(json.dumps(analysis, indent=2), content_type='application/json')
+        response = HttpResponse(dumps(analysis), content_type='application/json')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
@@ -0,0 +1,144 @@
+import codecs
+import csv
+import json
+
+# Each parser reads an uploaded file incrementally and yields (section, row dict) records,
+# so an import never holds the whole document in memory.
+
+JSON_DECODER = json.JSONDecoder()
+
+
+def decode_utf8(chunks):
+    # Wrong encodings surface as a ValueError the import view reports, like any other bad upload
+    try:
+        yield from codecs.iterdecode(chunks, 'utf-8-sig')
+    except UnicodeDecodeError as e:
+        raise ValueError(f'The file is not valid UTF-8: {e}')
+
+
+def iter_csv_records(file):
+    # CSV format as exported: a [SECTION] row, a header row, then data rows until a blank line
+    current = None
+    headers = []
+    reader = csv.reader(decode_utf8(file))
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            raise ValueError(f'Invalid CSV on line {reader.line_num}: {e}')
+        if not row or row[0].startswith('['):
+            current = row[0].strip('[]').lower() if row else None
+            headers = []
+            continue
+        if not headers:
+            headers = row
+            continue
+        if current:
+            yield current, dict(zip(headers, row))
+
+
+def iter_ndjson_records(file):
+    # One {"section": "...", "data": {...}} object per line
+    for number, line in enumerate(decode_utf8(file), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f'Invalid JSON on line {number}: {e}')
+        if not isinstance(record, dict) or not isinstance(record.get('data'), dict):
+            raise ValueError(f'Line {number} must be an object with "section" and "data" keys.')
+        yield str(record.get('section', '')).lower(), record['data']
+
+
+class JSONStream:
+    """Decodes JSON values one at a time from an iterator of text chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+        # Drop what has been consumed so the buffer only ever holds the value being decoded
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid JSON: expected one of {chars!r}, got {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = JSON_DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self.fill():
+                    continue
+                raise ValueError(f'Invalid JSON: {e}')
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_records(file, chunk_size=None):
+    # Top-level object mapping section names to lists of row objects, as exported
+    stream = JSONStream(decode_utf8(file.chunks(chunk_size)))
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        section = stream.value()
+        if not isinstance(section, str):
+            raise ValueError('Invalid JSON: section names must be strings.')
+        stream.expect(':')
+        if stream.peek() == '[':
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.expect(']')
+            else:
+                while True:
+                    row = stream.value()
+                    if not isinstance(row, dict):
+                        raise ValueError(f"Rows in section '{section}' must be objects.")
+                    yield section, row
+                    if stream.expect(',]') == ']':
+                        break
+        else:
+            # Anything that is not a list of rows is not an entity section
+            stream.value()
+        if stream.expect(',}') == '}':
+            break
+
+
+IMPORT_PARSERS = {
+    'csv': iter_csv_records,
+    'json': iter_json_records,
+    'ndjson': iter_ndjson_records,
+    'jsonl': iter_ndjson_records,
+}
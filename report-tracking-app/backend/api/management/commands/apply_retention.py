@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.retention import apply_retention, expired_rows, RETENTION_BATCH_SIZE, RETENTION_POLICIES
+
+
+class Command(BaseCommand):
+    help = 'Delete or archive expired notifications and messages in small batches (repeats every --interval seconds unless --once).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append', dest='policies', help=f"Policy to apply (repeatable): {', '.join(RETENTION_POLICIES)}. Default: all.")
+        parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE, help='Rows removed per transaction.')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+        parser.add_argument('--interval', type=float, default=86400, help='Seconds between runs.')
+        parser.add_argument('--once', action='store_true', help='Run once and exit.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows each policy would remove.')
+
+    def handle(self, *args, **options):
+        policies = options['policies'] or list(RETENTION_POLICIES)
+        unknown = set(policies) - set(RETENTION_POLICIES)
+        if unknown:
+            raise CommandError(f"Unknown retention policy: {', '.join(sorted(unknown))}")
+        if options['dry_run']:
+            for name in policies:
+                self.stdout.write(f"{name}: {expired_rows(name).count()} row(s) expired")
+            return
+        while True:
+            report = apply_retention(policies, options['batch_size'], pause=options['pause'])
+            for name, result in report.items():
+                action = 'archived' if result['archived'] else 'deleted'
+                self.stdout.write(f"{name}: {result['rows']} row(s) {action} in {result['batches']} batch(es), {result['elapsed']:.2f}s")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,87 @@
+import json
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+from api.import_export import CAMPAIGN_EXECUTION_FIELDS
+from api.renderers import FastJSONRenderer, json_backend
+
+
+def assignment_rows(count):
+    # Shaped like AssignmentSerializer output, where dates are already strings
+    assigned = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    return [
+        {
+            'id': i, 'campaign': i % 50 + 1, 'station': i % 30 + 1, 'analyst': i % 20 + 1, 'monitoring_period': None,
+            'assigned_at': (assigned + timedelta(minutes=i)).isoformat().replace('+00:00', 'Z'),
+            'planned_spots': 120, 'missed_spots': i % 7, 'transmitted_spots': 120 - i % 7, 'gain_spots': i % 3,
+            'status': 'SUBMITTED', 'submitted_at': None, 'due_date': '2025-02-01', 'memo': f'Assignment {i} memo',
+            'manager_comment': None, 'analyst_report_shared': False, 'authenticated_accepted': True,
+            'station_report_shared': False, 'overdue_notified_at': None,
+            'analyst_user': f'analyst{i % 20}', 'analyst_user_id': i % 20 + 1, 'analyst_user_full_name': f'Analyst {i % 20}',
+        }
+        for i in range(count)
+    ]
+
+
+def assignment_values(count):
+    # Shaped like Assignment.objects.values(): datetimes and dates left for the encoder
+    assigned = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    return [
+        {
+            'id': i, 'campaign_id': i % 50 + 1, 'station_id': i % 30 + 1, 'analyst_id': i % 20 + 1,
+            'assigned_at': assigned + timedelta(minutes=i), 'submitted_at': assigned + timedelta(days=1, minutes=i),
+            'due_date': date(2025, 2, 1), 'planned_spots': 120, 'missed_spots': i % 7,
+            'transmitted_spots': 120 - i % 7, 'status': 'APPROVED',
+        }
+        for i in range(count)
+    ]
+
+
+def export_rows(count):
+    return [
+        dict(zip(CAMPAIGN_EXECUTION_FIELDS, [
+            f'Client {i % 10}', f'Campaign {i % 50}', 'ACTIVE', '2025-01-01', '', i, 'APPROVED',
+            120, 120 - i % 7, i % 7, i % 3, f'Station {i % 30}', f'Analyst {i % 20}', f'analyst{i % 20}',
+            '2025-01-01', '2025-01-02',
+        ]))
+        for i in range(count)
+    ]
+
+
+PAYLOADS = {
+    'assignments': assignment_rows,
+    'assignment values': assignment_values,
+    'campaign execution export': export_rows,
+}
+
+ENCODERS = {
+    # What the export endpoints used to send
+    'json.dumps indent=2': lambda data: json.dumps(data, indent=2, cls=encoders.JSONEncoder).encode(),
+    'DRF JSONRenderer': JSONRenderer().render,
+    'FastJSONRenderer': FastJSONRenderer().render,
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare serialization time and payload size of the JSON encoders on large assignment and export responses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per payload.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per encoder; the fastest is reported.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"FastJSONRenderer backend: {json_backend()}")
+        for name, build in PAYLOADS.items():
+            data = build(options['rows'])
+            self.stdout.write(f"{name} ({options['rows']} rows):")
+            for label, encode in ENCODERS.items():
+                timings = []
+                for _ in range(max(options['repeat'], 1)):
+                    started = time.perf_counter()
+                    body = encode(data)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(f"  {label:<22} {min(timings) * 1000:8.1f} ms {len(body):>12,} bytes")
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.notifications import drain_outbox, OUTBOX_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Fan out queued notifications from the outbox in batches (runs until stopped unless --once).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE, help='Outbox events dispatched per transaction.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the outbox is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = drain_outbox(options['batch_size'])
+            if stats['events']:
+                throughput = stats['notifications'] / stats['elapsed'] if stats['elapsed'] else stats['notifications']
+                self.stdout.write(
+                    f"Dispatched {stats['events']} event(s) as {stats['notifications']} notification(s): "
+                    f"lag {stats['lag_seconds']:.2f}s, {throughput:.0f} notifications/s"
+                )
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Notification outbox drained.'))
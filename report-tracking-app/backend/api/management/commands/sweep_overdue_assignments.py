@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.workflow import sweep_overdue_assignments, OVERDUE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Queue one overdue notice per WIP assignment past its due date (repeats every --interval seconds unless --once).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OVERDUE_BATCH_SIZE, help='Assignments handled per transaction.')
+        parser.add_argument('--interval', type=float, default=3600, help='Seconds between sweeps.')
+        parser.add_argument('--once', action='store_true', help='Sweep once and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            swept = sweep_overdue_assignments(options['batch_size'])
+            self.stdout.write(f"Queued {swept} overdue notice(s) in {time.perf_counter() - started:.2f}s")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_station_is_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='read',
+            field=models.BooleanField(default=False),
+        ),
+    ]
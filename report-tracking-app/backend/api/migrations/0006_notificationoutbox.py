@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 07:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_message_read'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audience', models.CharField(blank=True, choices=[('', 'Listed users'), ('staff', 'All staff'), ('accountants', 'Accountants')], default='', max_length=16)),
+                ('user_ids', models.JSONField(blank=True, default=list)),
+                ('message', models.TextField()),
+                ('link', models.URLField(blank=True, null=True)),
+                ('deadline_date', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
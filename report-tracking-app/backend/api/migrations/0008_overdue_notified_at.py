@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 07:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='overdue_notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(condition=models.Q(('due_date__isnull', False), ('overdue_notified_at__isnull', True), ('status', 'WIP')), fields=['due_date'], name='assign_overdue_due_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User, Group
 
 # Accountant and Manager profile models
@@ -14,6 +14,55 @@ class ManagerProfile(models.Model):
     def __str__(self):
         return f"Manager: {self.user.username}"
 
+class TrackedFieldsMixin:
+    """
+    Remembers the database values of `tracked_fields` as loaded (or last saved),
+    so signal handlers can detect changes without re-reading the row.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._persisted = {
+            name: value for name, value in zip(field_names, values)
+            if name in cls.tracked_fields and value is not models.DEFERRED
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        persisted = getattr(self, '_persisted', {})
+        for name in self.tracked_fields:
+            if update_fields is None or name in update_fields:
+                persisted[name] = getattr(self, name)
+        self._persisted = persisted
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        persisted = getattr(self, '_persisted', {})
+        deferred = self.get_deferred_fields()
+        for name in self.tracked_fields:
+            if fields is not None and name not in fields:
+                continue
+            if name in deferred:
+                # Not reloaded: persisted_value() queries for it
+                persisted.pop(name, None)
+            else:
+                persisted[name] = getattr(self, name)
+        self._persisted = persisted
+
+    def persisted_value(self, name):
+        """Value of a tracked field as stored in the database; None for unsaved rows."""
+        persisted = getattr(self, '_persisted', {})
+        if name in persisted:
+            return persisted[name]
+        if self._state.adding or self.pk is None:
+            return None
+        # Loaded with the field deferred: fall back to a query
+        return type(self)._default_manager.filter(pk=self.pk).values_list(name, flat=True).first()
+
 class Client(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -40,7 +89,7 @@ class Station(models.Model):
     def __str__(self):
         return self.name
 
-class Campaign(models.Model):
+class Campaign(TrackedFieldsMixin, models.Model):
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='campaigns')
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -53,6 +102,7 @@ class Campaign(models.Model):
         ("CLOSED", "Closed"),
     ]
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="ACTIVE")
+    tracked_fields = ('status',)
 
     def __str__(self):
         return f"{self.name} ({self.client.name})"
@@ -77,10 +127,8 @@ class MediaAnalystProfile(models.Model):
         return self.user.username
 
 
-from django.db.models.signals import pre_save, post_save, m2m_changed
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from django.utils import timezone
-from django.contrib.auth.models import User as AuthUser
 
 # --- User Profile Auto-Creation Signal ---
 from django.apps import apps
@@ -91,8 +139,12 @@ def create_user_profile(sender, instance, created, **kwargs):
     Automatically create the correct profile for a user based on their group.
     This runs after user creation and after group assignment.
     """
+    from .roles import group_names as user_group_names, invalidate_roles
+    if created:
+        # Drop any cached roles left under a reused id before reading them
+        invalidate_roles(instance.pk)
     # Get all group names for this user
-    group_names = set(instance.groups.values_list('name', flat=True))
+    group_names = user_group_names(instance)
     # Only create if not already present
     if 'Admins' in group_names:
         AdminProfile = apps.get_model('api', 'AdminProfile')
@@ -107,7 +159,7 @@ def create_user_profile(sender, instance, created, **kwargs):
         ManagerProfile = apps.get_model('api', 'ManagerProfile')
         ManagerProfile.objects.get_or_create(user=instance)
 
-class Assignment(models.Model):
+class Assignment(TrackedFieldsMixin, models.Model):
     campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='assignments')
     station = models.ForeignKey(Station, on_delete=models.SET_NULL, null=True, blank=True, related_name='assignments')
     analyst = models.ForeignKey(MediaAnalystProfile, on_delete=models.CASCADE, related_name='assignments')
@@ -135,6 +187,30 @@ class Assignment(models.Model):
     analyst_report_shared = models.BooleanField(default=False)
     authenticated_accepted = models.BooleanField(default=False)
     station_report_shared = models.BooleanField(default=False)
+    # Set by the sweep_overdue_assignments command once the overdue notice is queued
+    overdue_notified_at = models.DateTimeField(null=True, blank=True)
+    tracked_fields = ('status',)
+
+    class Meta:
+        indexes = [
+            # An analyst's own list, newest first
+            models.Index(fields=['analyst', '-assigned_at'], name='assign_analyst_assigned_idx'),
+            # assigned_stations: station ids per campaign, read from the index alone
+            models.Index(fields=['campaign', 'station'], name='assign_campaign_station_idx'),
+            models.Index(fields=['status', 'due_date'], name='assign_status_due_idx'),
+            # Open work with a deadline and no overdue notice yet, range-scanned by the overdue sweep
+            models.Index(fields=['due_date'], name='assign_overdue_due_idx',
+                         condition=models.Q(status='WIP', due_date__isnull=False, overdue_notified_at__isnull=True)),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields:
+            # A status change may also stamp submitted_at (see api.workflow.prepare_transition)
+            kwargs['update_fields'] = set(update_fields) | {'submitted_at'}
+        # The row and the notifications its post_save writes commit together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def clean(self):
         # Only validate if all fields are present
@@ -155,7 +231,9 @@ class Assignment(models.Model):
 
 # --- Notification and Messaging Models ---
 
-class Notification(models.Model):
+class Notification(TrackedFieldsMixin, models.Model):
+    tracked_fields = ('read',)
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     message = models.TextField()
     link = models.URLField(blank=True, null=True)
@@ -163,97 +241,101 @@ class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     deadline_date = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-timestamp'], name='notif_user_ts_idx'),
+            # Unread badge and unread lists only touch unread rows
+            models.Index(fields=['user', '-timestamp'], name='notif_user_unread_idx', condition=models.Q(read=False)),
+            # Retention: oldest rows first within read/unread
+            models.Index(fields=['read', 'timestamp'], name='notif_read_ts_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message[:40]}"
 
+@receiver(pre_save, sender=Notification)
+def notification_pre_save(sender, instance, **kwargs):
+    instance._was_unread = instance.persisted_value('read') is False
+
+@receiver(post_save, sender=Notification)
+def notification_post_save(sender, instance, created, **kwargs):
+    # Keep the cached unread badge count in step with single-row creates and read flips
+    from .notifications import adjust_unread
+    is_unread = not instance.read
+    if created:
+        delta = 1 if is_unread else 0
+    else:
+        delta = int(is_unread) - int(instance._was_unread)
+    if delta:
+        transaction.on_commit(lambda: adjust_unread(instance.user_id, delta))
+
+@receiver(post_delete, sender=Notification)
+def notification_post_delete(sender, instance, **kwargs):
+    if not instance.read:
+        from .notifications import adjust_unread
+        transaction.on_commit(lambda: adjust_unread(instance.user_id, -1))
+
+class NotificationOutbox(models.Model):
+    """Notification waiting to be fanned out to its recipients by the dispatch_notifications command."""
+    AUDIENCE_CHOICES = [
+        ("", "Listed users"),
+        ("staff", "All staff"),
+        ("accountants", "Accountants"),
+    ]
+    audience = models.CharField(max_length=16, choices=AUDIENCE_CHOICES, blank=True, default="")
+    user_ids = models.JSONField(default=list, blank=True)  # Recipients when audience is blank
+    message = models.TextField()
+    link = models.URLField(blank=True, null=True)
+    deadline_date = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Outbox {self.audience or self.user_ids}: {self.message[:40]}"
+
+class NotificationArchive(models.Model):
+    """Notifications moved out of the hot table by the retention command (see api.retention)."""
+    original_id = models.BigIntegerField(unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    message = models.TextField()
+    link = models.URLField(blank=True, null=True)
+    read = models.BooleanField(default=False)
+    timestamp = models.DateTimeField()
+    deadline_date = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived notification {self.original_id} for user {self.user_id}"
+
 @receiver(pre_save, sender=Assignment)
 def assignment_pre_save(sender, instance, **kwargs):
-    # Cache old status before saving
-    if instance.pk:
-        try:
-            old = sender.objects.get(pk=instance.pk)
-            instance._old_status = old.status
-        except sender.DoesNotExist:
-            instance._old_status = None
+    # Cache old status before saving; it was captured when the row was loaded, so no extra SELECT
+    instance._old_status = instance.persisted_value('status')
+    # Fold the transition's follow-up fields into this same UPDATE
+    from .workflow import prepare_transition
+    prepare_transition(instance)
 
 @receiver(post_save, sender=Assignment)
 def assignment_post_save(sender, instance, created, **kwargs):
     # Import here to avoid circular
-    from .models import Notification
+    from .notifications import enqueue
+    from .workflow import send_transition_notifications
+    link = f"/assignments?assignmentId={instance.id}"
     # New assignment: notify analyst
     if created and instance.analyst and instance.analyst.user:
         # Notify analyst of new assignment with link to it
-        Notification.objects.create(
-            user=instance.analyst.user,
-            message=f"New assignment: Campaign {instance.campaign.name}",
-            link=f"/assignments?assignmentId={instance.id}",
-            deadline_date=instance.due_date
-        )
-        # If assignment is already overdue at creation, send overdue notice
-        if instance.status == 'WIP' and instance.due_date and instance.due_date < timezone.now().date():
-            Notification.objects.create(
-                user=instance.analyst.user,
-                message=f"Assignment overdue for campaign {instance.campaign.name}",
-                link=f"/assignments?assignmentId={instance.id}",
-                deadline_date=instance.due_date
-            )
+        enqueue(f"New assignment: Campaign {instance.campaign.name}", users=[instance.analyst.user_id],
+                link=link, deadline_date=instance.due_date)
     else:
-        old_status = getattr(instance, '_old_status', None)
-        new_status = instance.status
-        # Status changed
-        if new_status != old_status:
-            # Submitted: notify managers
-            if new_status == 'SUBMITTED':
-                # Auto-set submitted_at timestamp if not already set
-                if not instance.submitted_at:
-                    # Use sender to avoid direct model import
-                    sender.objects.filter(pk=instance.pk).update(submitted_at=timezone.now())
-                # Notify all staff managers with link to review
-                managers = AuthUser.objects.filter(is_staff=True)
-                for mgr in managers:
-                    Notification.objects.create(
-                        user=mgr,
-                        message=f"Assignment submitted by {instance.analyst.user.username} for campaign {instance.campaign.name}",
-                        link=f"/assignments?assignmentId={instance.id}",
-                        deadline_date=instance.due_date
-                    )
-            # Approved: notify analyst
-            if new_status == 'APPROVED':
-                # Notify analyst of approval
-                Notification.objects.create(
-                    user=instance.analyst.user,
-                    message=f"Your assignment for campaign {instance.campaign.name} has been approved",
-                    link=f"/assignments?assignmentId={instance.id}" 
-                )
-            # Rejected: notify analyst
-            if new_status == 'REJECTED':
-                # Notify analyst of rejection
-                Notification.objects.create(
-                    user=instance.analyst.user,
-                    message=f"Your assignment for campaign {instance.campaign.name} has been rejected",
-                    link=f"/assignments?assignmentId={instance.id}" 
-                )
-                # Reset status to WIP after rejection
-                sender.objects.filter(pk=instance.pk).update(status='WIP')
-        # Overdue check: if still WIP and past due
-        # Overdue check: if still WIP and past due, send only one overdue notification per save
-        if instance.status == 'WIP' and instance.due_date and instance.due_date < timezone.now().date():
-            Notification.objects.create(
-                user=instance.analyst.user,
-                message=f"Assignment overdue for campaign {instance.campaign.name}",
-                link=f"/assignments?assignmentId={instance.id}",
-                deadline_date=instance.due_date
-            )
+        # Status changed: notify managers (submitted) or the analyst (approved/rejected)
+        transition = getattr(instance, '_transition', None)
+        if transition:
+            send_transition_notifications(instance, transition[1])
+    # Overdue notices are sent once per assignment by the sweep_overdue_assignments command
 
 @receiver(pre_save, sender=Campaign)
 def campaign_pre_save(sender, instance, **kwargs):
-    # Cache old status before saving
-    if instance.pk:
-        try:
-            old = sender.objects.get(pk=instance.pk)
-            instance._old_status = old.status
-        except sender.DoesNotExist:
-            instance._old_status = None
+    # Cache old status before saving; it was captured when the row was loaded, so no extra SELECT
+    instance._old_status = instance.persisted_value('status')
 
 @receiver(post_save, sender=Campaign)
 def campaign_post_save(sender, instance, created, **kwargs):
@@ -265,19 +347,12 @@ def campaign_post_save(sender, instance, created, **kwargs):
 
     # Notify accountants if campaign status changes to "CLOSED"
     if new_status == "CLOSED" and old_status != "CLOSED":
-        try:
-            accountant_group = Group.objects.get(name='Accountant')
-            accountant_users = User.objects.filter(groups=accountant_group)
-            for user_accountant in accountant_users:
-                Notification.objects.create(
-                    user=user_accountant,
-                    message=f"Campaign '{instance.name}' has been closed and is ready for payment processing.",
-                    link=f"/campaigns/{instance.id}" # Or a link to a specific accountant view
-                )
-        except Group.DoesNotExist:
-            print("ERROR: Accountant group not found. Cannot send campaign closure notifications to accountants.")
-        except Exception as e:
-            print(f"ERROR: Could not send notification to accountants: {e}")
+        from .notifications import enqueue
+        enqueue(
+            f"Campaign '{instance.name}' has been closed and is ready for payment processing.",
+            audience='accountants',
+            link=f"/campaigns/{instance.id}" # Or a link to a specific accountant view
+        )
 
 class Message(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
@@ -285,6 +360,31 @@ class Message(models.Model):
     context = models.CharField(max_length=255, blank=True, help_text="Context (e.g., campaign/task id)")
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    read = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # One conversation (participants + context) in time order; equality on both
+            # participants, so it serves either direction of the thread
+            models.Index(fields=['recipient', 'sender', 'context', 'timestamp'], name='msg_thread_idx'),
+            models.Index(fields=['recipient', '-timestamp'], name='msg_unread_idx', condition=models.Q(read=False)),
+            models.Index(fields=['read', 'timestamp'], name='msg_read_ts_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} to {self.recipient.username} at {self.timestamp}"
+
+class MessageArchive(models.Model):
+    """Messages moved out of the hot table by the retention command (see api.retention)."""
+    original_id = models.BigIntegerField(unique=True)
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    context = models.CharField(max_length=255, blank=True)
+    content = models.TextField()
+    timestamp = models.DateTimeField()
+    read = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived message {self.original_id} from {self.sender_id} to {self.recipient_id}"
+
@@ -0,0 +1,77 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+
+
+def reversed_ordering(ordering):
+    return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+
+class OptInCursorPagination(CursorPagination):
+    """
+    Keyset (cursor) pagination; page size defaults to REST_FRAMEWORK['PAGE_SIZE'].
+    Clients that send neither ?cursor= nor ?page_size= still get a plain list, so existing
+    screens keep working while they move to the paginated {next, previous, results} shape.
+    Where unpaginated_limit is set, that list holds only the newest unpaginated_limit rows,
+    still in the view's order, and a capped response carries an X-Result-Limit header.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    # None returns every row; only set for tables that grow without bound
+    unpaginated_limit = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        self.unpaginated = self.cursor_query_param not in params and self.page_size_query_param not in params
+        if not self.unpaginated:
+            return super().paginate_queryset(queryset, request, view)
+        if self.unpaginated_limit is None:
+            return None
+        ordering = self.get_ordering(request, queryset, view)
+        view_ordering = tuple(queryset.query.order_by)
+        # Views listing oldest first (message threads) keep their newest rows, reversed afterwards
+        oldest_first = bool(view_ordering) and reversed_ordering(ordering)[:len(view_ordering)] == view_ordering
+        if oldest_first or not queryset.ordered:
+            queryset = queryset.order_by(*ordering)
+        # One row past the limit tells whether the list was cut short
+        rows = list(queryset[:self.unpaginated_limit + 1])
+        self.truncated = len(rows) > self.unpaginated_limit
+        rows = rows[:self.unpaginated_limit]
+        if oldest_first:
+            rows.reverse()
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.unpaginated:
+            return super().get_paginated_response(data)
+        response = Response(data)
+        if self.truncated:
+            response['X-Result-Limit'] = self.unpaginated_limit
+        return response
+
+
+class AssignmentPagination(OptInCursorPagination):
+    ordering = ('-assigned_at', '-id')
+    unpaginated_limit = 1000
+
+
+class TimestampPagination(OptInCursorPagination):
+    # Notifications and messages
+    ordering = ('-timestamp', '-id')
+    unpaginated_limit = 1000
+
+
+class CreatedAtPagination(OptInCursorPagination):
+    # Campaigns and stations
+    ordering = ('-created_at', '-id')
+
+
+class ThreadPagination(LimitOffsetPagination):
+    """Offset pagination for computed message threads, used when ?limit= or ?offset= is sent."""
+    max_limit = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.limit_query_param not in params and self.offset_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
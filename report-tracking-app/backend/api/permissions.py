@@ -1,5 +1,7 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from .roles import is_accountant, is_admin, is_admin_or_manager
+
 
 class IsAdminOrManagerForEntities(BasePermission):
     """
@@ -16,14 +18,10 @@ class IsAdminOrManagerForEntities(BasePermission):
             return True
         # For user creation, only Admins (is_superuser or in 'Admins' group)
         if hasattr(view, 'basename') and view.basename == 'user':
-            return user.is_superuser or user.groups.filter(name='Admins').exists()
+            return is_admin(user)
         # For clients, campaigns, stations, assignments: Admins or Managers
         if hasattr(view, 'basename') and view.basename in ['client', 'campaign', 'station', 'assignment']:
-            return (
-                user.is_superuser or
-                user.groups.filter(name='Admins').exists() or
-                user.groups.filter(name='Managers').exists()
-            )
+            return is_admin_or_manager(user)
         return False
 
 
@@ -33,7 +31,7 @@ class IsAccountant(BasePermission):
     """
     def has_permission(self, request, view):
         user = request.user
-        return user.is_authenticated and user.groups.filter(name='Accountants').exists()
+        return user.is_authenticated and is_accountant(user)
 
 class CanInteractWithMessages(BasePermission):
     """
@@ -54,7 +52,7 @@ class CanUpdateOwnAssignmentOrAdminManager(BasePermission):
     def has_object_permission(self, request, view, obj):
         user = request.user
         # Admins/Managers always allowed
-        if user.is_superuser or user.groups.filter(name__in=["Admins", "Managers"]).exists():
+        if is_admin_or_manager(user):
             return True
         # PATCH/PUT allowed for assigned analyst
         if request.method in ["PATCH", "PUT"]:
@@ -0,0 +1,58 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # Optional accelerator; without it the standard library produces the same output
+    orjson = None
+
+# Decimal, timedelta, lazy strings, querysets, ... are encoded the way DRF's JSONRenderer does
+ENCODER = encoders.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def use_orjson():
+    # settings.FAST_JSON = False forces the standard library, e.g. to compare output
+    return orjson is not None and getattr(settings, 'FAST_JSON', True)
+
+
+def json_backend():
+    return 'orjson' if use_orjson() else 'stdlib'
+
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes. Datetimes in UTC end in Z and Decimals become numbers, as with DRF."""
+    if use_orjson():
+        return orjson.dumps(data, default=ENCODER.default, option=ORJSON_OPTIONS)
+    return ENCODER.encode(data).encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer with compact output from dumps(). A client that asks for indentation
+    (Accept: application/json; indent=2) gets DRF's own pretty-printed rendering.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like DRF, escape the line separators JSON allows but JavaScript string literals do not
+        return dumps(data).replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser that decodes UTF-8 request bodies with orjson when it is installed."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if not use_orjson() or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,100 @@
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive, Message, MessageArchive
+from .notifications import adjust_unread
+
+# policy name -> (model, archive model, rows the policy applies to)
+RETENTION_POLICIES = {
+    'read_notifications': (Notification, NotificationArchive, {'read': True}),
+    'unread_notifications': (Notification, NotificationArchive, {'read': False}),
+    'read_messages': (Message, MessageArchive, {'read': True}),
+}
+# Age in days after which rows are removed (None keeps them) and whether they are archived
+# first; override per policy with settings.RETENTION. Unread rows are kept unless an operator opts in.
+RETENTION_DEFAULTS = {
+    'read_notifications': {'days': 30, 'archive': False},
+    'unread_notifications': {'days': None, 'archive': True},
+    'read_messages': {'days': None, 'archive': True},
+}
+RETENTION_BATCH_SIZE = 1000
+
+
+def retention_settings():
+    configured = getattr(settings, 'RETENTION', {})
+    return {name: {**defaults, **configured.get(name, {})} for name, defaults in RETENTION_DEFAULTS.items()}
+
+
+def expired_rows(name, now=None):
+    model, _, condition = RETENTION_POLICIES[name]
+    days = retention_settings()[name]['days']
+    if days is None:
+        return model.objects.none()
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return model.objects.filter(timestamp__lt=cutoff, **condition)
+
+
+def archive_rows(archive_model, rows):
+    archive_model.objects.bulk_create(
+        [archive_model(original_id=row.pop('id'), **row) for row in rows],
+        ignore_conflicts=True,
+    )
+
+
+def delete_ids(model, ids):
+    # One DELETE statement, without the deletion collector's per-row signals
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({', '.join(['%s'] * len(ids))})", ids)
+
+
+def unread_counts(name, batch):
+    # Unread notifications deleted without signals must still leave the cached unread counters
+    model, _, condition = RETENTION_POLICIES[name]
+    if model is Notification and condition.get('read') is False:
+        return Counter(batch.values_list('user_id', flat=True))
+    return {}
+
+
+def apply_policy(name, batch_size=RETENTION_BATCH_SIZE, now=None, pause=0.0):
+    """
+    Remove (or archive, then remove) one policy's expired rows, oldest first, one short
+    transaction per batch so no lock is held for long. Each batch is removed with one DELETE
+    that sends no per-row signals, so the cached unread counters are adjusted here instead.
+    pause sleeps between batches to leave room for regular traffic. Returns {'rows', 'batches', 'archived', 'elapsed'}.
+    """
+    model, archive_model, _ = RETENTION_POLICIES[name]
+    archive = retention_settings()[name]['archive']
+    expired = expired_rows(name, now)
+    started = time.perf_counter()
+    rows = batches = 0
+    while True:
+        with transaction.atomic():
+            ids = list(expired.order_by('timestamp', 'id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            batch = model.objects.filter(pk__in=ids)
+            if archive:
+                archive_rows(archive_model, list(batch.values()))
+            unread = unread_counts(name, batch)
+            delete_ids(model, ids)
+            if unread:
+                transaction.on_commit(lambda unread=unread: [adjust_unread(user_id, -count) for user_id, count in unread.items()])
+        rows += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return {'rows': rows, 'batches': batches, 'archived': archive, 'elapsed': round(time.perf_counter() - started, 3)}
+
+
+def apply_retention(policies=None, batch_size=RETENTION_BATCH_SIZE, now=None, pause=0.0):
+    """Apply the given policies (all by default); returns the per-policy report of apply_policy."""
+    return {name: apply_policy(name, batch_size, now, pause) for name in policies or RETENTION_POLICIES}
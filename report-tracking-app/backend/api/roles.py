@@ -0,0 +1,58 @@
+from django.core.cache import cache
+
+# Group names are cached per user across requests; signals in api.signals drop the entry
+# whenever the user's group membership (or a group's name) changes.
+ROLE_CACHE_TIMEOUT = 600
+
+
+def role_cache_key(user_id):
+    return f'roles:user:{user_id}'
+
+
+def group_names(user):
+    """
+    The user's group names as a frozenset. Loaded with at most one query per user object
+    (request.user lives for one request) and shared between requests through the cache.
+    """
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    names = getattr(user, '_group_names', None)
+    if names is None:
+        key = role_cache_key(user.pk)
+        names = cache.get(key)
+        if names is None:
+            names = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, names, ROLE_CACHE_TIMEOUT)
+        user._group_names = names
+    return names
+
+
+def in_group(user, *names):
+    return not group_names(user).isdisjoint(names)
+
+
+def is_admin(user):
+    return user.is_superuser or in_group(user, 'Admins')
+
+
+def is_admin_or_manager(user):
+    return user.is_superuser or in_group(user, 'Admins', 'Managers')
+
+
+def is_accountant(user):
+    return in_group(user, 'Accountants')
+
+
+def frontend_role(user):
+    """Normalized role for the frontend UI."""
+    if is_admin(user):
+        return 'admin'
+    if in_group(user, 'Managers'):
+        return 'manager'
+    if in_group(user, 'Accountants'):
+        return 'accountant'
+    return 'analyst'
+
+
+def invalidate_roles(*user_ids):
+    cache.delete_many([role_cache_key(user_id) for user_id in user_ids])
@@ -2,6 +2,8 @@ from rest_framework import serializers
 from .models import Notification, Message
 from django.contrib.auth.models import User
 from .models import Client, Station, Campaign, MonitoringPeriod, MediaAnalystProfile, Assignment
+from .fieldsets import SparseFieldsSerializerMixin
+from .workflow import check_transition, InvalidTransition
 
 # --- Notification Serializer ---
 class NotificationSerializer(serializers.ModelSerializer):
@@ -19,24 +21,24 @@ class MessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Message
-        fields = ['id', 'sender', 'sender_id', 'recipient', 'context', 'content', 'timestamp'] # Added sender_id to fields
+        fields = ['id', 'sender', 'sender_id', 'recipient', 'context', 'content', 'timestamp', 'read'] # Added sender_id to fields
         read_only_fields = ['id', 'timestamp', 'sender', 'sender_id'] # Sender and sender_id are set by the backend or derived
 
     def create(self, validated_data):
         # Sender is set in the view's perform_create method
         return Message.objects.create(**validated_data)
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Client
         fields = '__all__'
 
-class StationSerializer(serializers.ModelSerializer):
+class StationSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Station
         fields = '__all__'  # is_active now included
 
-class CampaignSerializer(serializers.ModelSerializer):
+class CampaignSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     stations = serializers.PrimaryKeyRelatedField(queryset=Station.objects.all(), many=True, required=False) # Made not required by default
     client_name = serializers.CharField(source='client.name', read_only=True)
 
@@ -53,6 +55,9 @@ class AccountantCampaignSummarySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'client_name', 'status', 'created_at', 'anticipated_campaign_completion_date']
 
     def get_anticipated_campaign_completion_date(self, obj):
+        # AccountantCampaignViewSet annotates the date in its list query; single objects fall back to a lookup
+        if hasattr(obj, 'anticipated_completion_date'):
+            return obj.anticipated_completion_date
         latest_monitoring_period = MonitoringPeriod.objects.filter(campaign=obj).order_by('-authentication_end').first()
         if latest_monitoring_period:
             return latest_monitoring_period.authentication_end
@@ -72,40 +77,49 @@ class MediaAnalystProfileSerializer(serializers.ModelSerializer):
         # Include model PK, username, and user_id
         fields = ['id', 'user', 'user_id']
 
-class AssignmentSerializer(serializers.ModelSerializer):
-
-    analyst_user = serializers.SerializerMethodField()
-    analyst_user_id = serializers.SerializerMethodField()
-    analyst_user_full_name = serializers.SerializerMethodField()
-
-    def get_analyst_user(self, obj):
-        if obj.analyst and obj.analyst.user:
-            return obj.analyst.user.username
-        return None
-
-    def get_analyst_user_id(self, obj):
-        if obj.analyst and obj.analyst.user:
-            return obj.analyst.user.id
-        return None
-
-    def get_analyst_user_full_name(self, obj):
-        if obj.analyst and obj.analyst.user:
-            return obj.analyst.user.get_full_name() or obj.analyst.user.username
-        return None
-
+class AssignmentSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Assignment
         fields = '__all__'
+        read_only_fields = ['overdue_notified_at']  # Maintained by the overdue sweep
         extra_fields = ['analyst_user', 'analyst_user_id', 'analyst_user_full_name']
 
+    def get_analyst_fields(self, obj):
+        # Resolve analyst.user once per row; list views select_related('analyst__user') so this costs no query
+        user = obj.analyst.user if obj.analyst_id else None
+        if user is None:
+            return {'analyst_user': None, 'analyst_user_id': None, 'analyst_user_full_name': None}
+        return {
+            'analyst_user': user.username,
+            'analyst_user_id': user.id,
+            'analyst_user_full_name': user.get_full_name() or user.username,
+        }
+
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        rep['analyst_user'] = self.get_analyst_user(instance)
-        rep['analyst_user_id'] = self.get_analyst_user_id(instance)
-        rep['analyst_user_full_name'] = self.get_analyst_user_full_name(instance)
+        if self.selected_extra_fields:
+            rep.update({
+                name: value for name, value in self.get_analyst_fields(instance).items()
+                if name in self.selected_extra_fields
+            })
         return rep
 
+    def model_field_names(self):
+        names = super().model_field_names()
+        if names is not None and self.selected_extra_fields:
+            names.add('analyst')
+        return names
+
+    def validate_status(self, value):
+        # Only transitions allowed by the assignment workflow
+        if self.instance is not None:
+            try:
+                check_transition(self.instance.persisted_value('status'), value)
+            except InvalidTransition as e:
+                raise serializers.ValidationError(str(e))
+        return value
+
     def validate(self, data):
         planned = data.get('planned_spots')
         missed = data.get('missed_spots')
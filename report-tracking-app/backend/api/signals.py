@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from django.contrib.auth.models import User
-from .models import MediaAnalystProfile, AccountantProfile, ManagerProfile
+from django.contrib.auth.models import Group, User
+from rest_framework.authtoken.models import Token
+from .authentication import revoke_token
+from .caching import bump_version
+from .consumers import push_message
+from .models import MediaAnalystProfile, AccountantProfile, ManagerProfile, Message, Station, Client, Campaign
+from .roles import in_group, invalidate_roles
 
 
 @receiver(post_save, sender=User)
@@ -9,8 +15,89 @@ def create_user_profiles(sender, instance, created, **kwargs):
     if created:
         MediaAnalystProfile.objects.get_or_create(user=instance)
         # Create AccountantProfile if user is in Accountant group
-        if instance.groups.filter(name='Accountant').exists():
+        if in_group(instance, 'Accountant'):
             AccountantProfile.objects.get_or_create(user=instance)
         # Create ManagerProfile if user is in Manager group
-        if instance.groups.filter(name='Manager').exists():
+        if in_group(instance, 'Manager'):
             ManagerProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Message)
+def push_new_message(sender, instance, created, **kwargs):
+    # Delivered over WebSocket to both participants once the message is committed
+    if created:
+        transaction.on_commit(lambda: push_message(instance))
+
+
+# --- Role cache invalidation ---
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # group.user_set.clear(): remember the members before they are gone
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        user_ids = list(pk_set) if pk_set is not None else getattr(instance, '_cleared_user_ids', [])
+    else:
+        user_ids = [instance.pk]
+        instance._group_names = None
+    invalidate_roles(*user_ids)
+    # Again after commit, in case another request re-cached the old groups meanwhile
+    transaction.on_commit(lambda: invalidate_roles(*user_ids))
+    # Analyst lists filter on group membership
+    bump_after_commit(User)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # A renamed or deleted group changes the role of every member
+    if instance.pk:
+        user_ids = list(instance.user_set.values_list('pk', flat=True))
+        invalidate_roles(*user_ids)
+        transaction.on_commit(lambda: invalidate_roles(*user_ids))
+        bump_after_commit(User)
+
+
+# --- Token cache revocation ---
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    revoke_token(instance.key)
+    transaction.on_commit(lambda: revoke_token(instance.key))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # Deactivation, password or permission changes: cached copies of the user are dropped
+    if created:
+        return
+    keys = list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+    for key in keys:
+        revoke_token(key)
+    transaction.on_commit(lambda: [revoke_token(key) for key in keys])
+
+
+# --- Response cache versions (api.caching) ---
+CACHED_MODELS = (Station, Client, Campaign, MediaAnalystProfile, User)
+
+
+def bump_after_commit(model):
+    bump_version(model)
+    # Again after commit: a request may have cached the pre-commit rows meanwhile
+    transaction.on_commit(lambda: bump_version(model))
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def cached_model_changed(sender, **kwargs):
+    if sender in CACHED_MODELS:
+        bump_after_commit(sender)
+
+
+@receiver(m2m_changed, sender=Campaign.stations.through)
+def campaign_stations_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_after_commit(Campaign)
+
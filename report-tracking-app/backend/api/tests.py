@@ -21,14 +21,36 @@ class PermissionTestCase(APITestCase):
         self.client.force_authenticate(user=self.manager)
         response = self.client.post('/api/clients/', {'name': 'TestClient'})
         self.assertIn(response.status_code, (201, 200))
-from django.test import TestCase
+import json
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-from django.contrib.auth.models import User
-from .models import Assignment, Notification, Campaign, MediaAnalystProfile, Client
+from django.contrib.auth.models import Group, User
+from .models import Assignment, Notification, NotificationOutbox, NotificationArchive, MessageArchive, Campaign, MediaAnalystProfile, Client, Station, MonitoringPeriod, Message
+from .import_parsers import iter_csv_records, iter_json_records, iter_ndjson_records
+from .workflow import transition_assignment, InvalidTransition, sweep_overdue_assignments
+from .authentication import TOKEN_CACHE
+from .renderers import FastJSONRenderer, dumps
+from .pagination import AssignmentPagination, TimestampPagination
+from .retention import apply_retention
+from .notifications import drain_outbox, enqueue, get_unread_count, unread_cache_key
 
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
+
+from core.asgi import application
 from rest_framework import status as http_status
 
 
@@ -51,6 +73,7 @@ class AssignmentNotificationTests(TestCase):
             analyst=self.analyst,
             due_date=due
         )
+        drain_outbox()
         # Analyst should have a 'New assignment' notification
         notes = Notification.objects.filter(user=self.analyst_user)
         self.assertTrue(notes.exists())
@@ -64,10 +87,12 @@ class AssignmentNotificationTests(TestCase):
             due_date=timezone.now().date() + timedelta(days=1)
         )
         # Clear initial notifications
+        drain_outbox()
         Notification.objects.all().delete()
         # Submit assignment
         a.status = 'SUBMITTED'
         a.save()
+        drain_outbox()
         # Manager should be notified
         mgr_notes = Notification.objects.filter(user=self.manager)
         self.assertTrue(mgr_notes.filter(message__icontains='submitted').exists())
@@ -76,6 +101,7 @@ class AssignmentNotificationTests(TestCase):
         # Approve assignment
         a.status = 'APPROVED'
         a.save()
+        drain_outbox()
         # Analyst should be notified of approval
         appr_notes = Notification.objects.filter(user=self.analyst_user)
         self.assertTrue(appr_notes.filter(message__icontains='approved').exists())
@@ -88,6 +114,9 @@ class AssignmentNotificationTests(TestCase):
             analyst=self.analyst,
             due_date=past
         )
+        # The overdue sweep sends the notice
+        sweep_overdue_assignments()
+        drain_outbox()
         # Analyst should receive overdue notice
         overdue = Notification.objects.filter(user=self.analyst_user, message__icontains='overdue')
         self.assertTrue(overdue.exists())
@@ -96,6 +125,7 @@ class AssignmentNotificationTests(TestCase):
         # Reject assignment
         a.status = 'REJECTED'
         a.save()
+        drain_outbox()
         # Analyst should be notified of rejection
         rej = Notification.objects.filter(user=self.analyst_user, message__icontains='rejected')
         self.assertTrue(rej.exists())
@@ -173,3 +203,1092 @@ class CampaignStatusTests(TestCase):
         self.assertEqual(response.status_code, http_status.HTTP_200_OK)
         self.campaign.refresh_from_db()
         self.assertEqual(self.campaign.status, 'COMPLETED')
+
+class CampaignExecutionStreamingExportTests(TestCase):
+    """Test that the campaign execution export streams CSV, JSON and NDJSON rows"""
+    def setUp(self):
+        self.admin = User.objects.create_user(username='exporter', password='pass', is_staff=True)
+        self.analyst_user = User.objects.create_user(username='streamer', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.client_obj = Client.objects.create(name='StreamClient')
+        self.campaign = Campaign.objects.create(name='StreamCamp', client=self.client_obj)
+        for planned in (10, 20, 30):
+            Assignment.objects.create(campaign=self.campaign, analyst=self.analyst, planned_spots=planned)
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin)
+
+    def test_stream_ndjson(self):
+        response = self.api_client.get('/api/export/campaign-execution/', {'format': 'ndjson', 'chunk_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([r['Planned Spots'] for r in rows], [10, 20, 30])
+        self.assertEqual(rows[0]['Client Name'], 'StreamClient')
+
+    def test_stream_csv(self):
+        # CSV, the default format, is always streamed
+        response = self.api_client.get('/api/export/campaign-execution/')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('Client Name,Campaign Name'))
+        self.assertEqual(len(lines), 4)
+
+    def test_stream_json(self):
+        response = self.api_client.get('/api/export/campaign-execution/', {'format': 'json', 'chunk_size': 2})
+        self.assertTrue(response.streaming)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([r['Planned Spots'] for r in rows], [10, 20, 30])
+        response = self.api_client.get('/api/export/campaign-execution/', {'format': 'json', 'client_id': '0'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+class AnalysisExportTests(TestCase):
+    """Test that analysis rollups are computed with one grouped query"""
+    def setUp(self):
+        self.admin = User.objects.create_user(username='analysis_admin', password='pass', is_staff=True)
+        self.analyst_user = User.objects.create_user(username='analysis_analyst', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.client_obj = Client.objects.create(name='AnalysisClient')
+        self.station = Station.objects.create(name='AnalysisFM')
+        for name in ('CampA', 'CampB', 'CampC'):
+            campaign = Campaign.objects.create(name=name, client=self.client_obj)
+            Assignment.objects.create(campaign=campaign, analyst=self.analyst, station=self.station,
+                                      planned_spots=10, missed_spots=2, transmitted_spots=8)
+        Campaign.objects.create(name='Empty', client=self.client_obj)
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin)
+
+    def test_campaign_totals_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.api_client.get('/api/import_export/analysis/export/')
+        rows = json.loads(response.content)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0], {'campaign': 'CampA', 'planned': 10, 'missed': 2, 'transmitted': 8, 'share': '80.0%'})
+        self.assertEqual(rows[3]['planned'], 0)
+
+    def test_group_by_rollups(self):
+        for group_by, label in (('client', 'AnalysisClient'), ('station', 'AnalysisFM'), ('analyst', 'analysis_analyst')):
+            with self.assertNumQueries(1):
+                response = self.api_client.get('/api/import_export/analysis/export/', {'group_by': group_by})
+            row = next(r for r in json.loads(response.content) if r[group_by] == label)
+            self.assertEqual(row['planned'], 30)
+            self.assertEqual(row['transmitted'], 24)
+
+    def test_unknown_group_by(self):
+        response = self.api_client.get('/api/import_export/analysis/export/', {'group_by': 'weekday'})
+        self.assertEqual(response.status_code, 400)
+
+class BulkEntityImportTests(TestCase):
+    """Test the bulk entity import pipeline"""
+    def setUp(self):
+        self.admin = User.objects.create_user(username='importer', password='pass', is_staff=True)
+        self.analyst_user = User.objects.create_user(username='restored', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin)
+
+    def upload(self, name, content, **extra):
+        upload = SimpleUploadedFile(name, content.encode('utf-8'))
+        return self.api_client.post('/api/import_export/entities/import/', {'file': upload, **extra}, format='multipart')
+
+    def backup(self):
+        return {
+            'stations': [{'id': 501, 'name': 'Restore FM', 'contacts': [], 'is_active': True}],
+            'clients': [{'id': 601, 'name': 'Restore Client', 'contract_value': '1200.50'}],
+            'campaigns': [{'id': 701, 'client': 601, 'client_name': 'Restore Client', 'name': 'Restore Camp',
+                           'stations': [501], 'status': 'ACTIVE'}],
+            'assignments': [{'id': 801, 'campaign': 701, 'station': 501, 'analyst': self.analyst.id,
+                             'status': 'WIP', 'planned_spots': 5, 'analyst_user': 'restored'}],
+        }
+
+    def test_json_restore(self):
+        response = self.upload('backup.json', json.dumps(self.backup()))
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['imported'], {'stations': 1, 'clients': 1, 'campaigns': 1, 'assignments': 1})
+        self.assertEqual(set(report['timing']), set(report['imported']))
+        self.assertIn('rows_per_second', report)
+        campaign = Campaign.objects.get(pk=701)
+        self.assertEqual(campaign.client.name, 'Restore Client')
+        self.assertEqual(list(campaign.stations.values_list('id', flat=True)), [501])
+        self.assertEqual(Assignment.objects.get(pk=801).planned_spots, 5)
+        # Signals are sent unless suppressed
+        drain_outbox()
+        self.assertTrue(Notification.objects.filter(user=self.analyst_user, message__icontains='New assignment').exists())
+
+    def test_restore_updates_existing_and_suppresses_signals(self):
+        self.upload('backup.json', json.dumps(self.backup()), suppress_signals='1')
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertFalse(Notification.objects.filter(user=self.analyst_user).exists())
+        csv_backup = (
+            '[STATIONS]\r\nid,name,location,is_active\r\n501,Renamed FM,,False\r\n\r\n'
+            '[ASSIGNMENTS]\r\nid,campaign,analyst,status,planned_spots,due_date\r\n'
+            f'801,701,{self.analyst.id},WIP,9,\r\n'
+        )
+        response = self.upload('backup.csv', csv_backup, suppress_signals='true', batch_size='1')
+        self.assertEqual(response.json()['imported'], {'stations': 1, 'assignments': 1})
+        station = Station.objects.get(pk=501)
+        self.assertEqual(station.name, 'Renamed FM')
+        self.assertFalse(station.is_active)
+        self.assertEqual(Assignment.objects.get(pk=801).planned_spots, 9)
+        self.assertFalse(Notification.objects.filter(user=self.analyst_user).exists())
+
+    def test_restore_over_unchanged_rows_does_not_notify(self):
+        backup = self.backup()
+        backup['campaigns'][0]['status'] = 'CLOSED'
+        backup['assignments'][0]['status'] = 'APPROVED'
+        self.upload('backup.json', json.dumps(backup), suppress_signals='1')
+        self.upload('backup.json', json.dumps(backup))
+        self.assertFalse(NotificationOutbox.objects.exists())
+        # A status that does change is still announced
+        backup['assignments'][0]['status'] = 'SUBMITTED'
+        self.upload('backup.json', json.dumps(backup))
+        self.assertEqual(list(NotificationOutbox.objects.values_list('audience', flat=True)), ['staff'])
+
+    def test_restore_keeps_creation_times(self):
+        backup = self.backup()
+        backup['stations'][0]['created_at'] = '2020-01-01T08:00:00Z'
+        backup['assignments'][0]['assigned_at'] = '2021-06-01T12:30:00Z'
+        for suppress in ('1', ''):
+            Station.objects.all().delete()
+            response = self.upload('backup.json', json.dumps(backup), suppress_signals=suppress)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(Station.objects.get(pk=501).created_at, datetime(2020, 1, 1, 8, tzinfo=dt_timezone.utc))
+            self.assertEqual(Assignment.objects.get(pk=801).assigned_at, datetime(2021, 6, 1, 12, 30, tzinfo=dt_timezone.utc))
+        # Rows that already exist keep their own creation time
+        backup['stations'][0]['created_at'] = '2024-01-01T00:00:00Z'
+        self.upload('backup.json', json.dumps(backup))
+        self.assertEqual(Station.objects.get(pk=501).created_at.year, 2020)
+
+    def test_row_without_id(self):
+        response = self.upload('backup.json', json.dumps({'clients': [{'name': 'No id'}]}))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Client.objects.filter(name='No id').exists())
+
+class EntityExportTests(TestCase):
+    """Test the streamed entity export"""
+    def setUp(self):
+        self.admin = User.objects.create_user(username='backup_admin', password='pass', is_staff=True)
+        self.analyst_user = User.objects.create_user(username='backup_analyst', password='pass', first_name='Ada', last_name='Lee')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.station = Station.objects.create(name='Backup FM', contacts=[{'name': 'Desk'}])
+        self.client_obj = Client.objects.create(name='Backup Client', contract_value=Decimal('1200.50'))
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin)
+
+    def add_campaigns(self, count):
+        for i in range(count):
+            campaign = Campaign.objects.create(name=f'Backup Camp {i}', client=self.client_obj)
+            campaign.stations.add(self.station)
+            Assignment.objects.create(campaign=campaign, analyst=self.analyst, station=self.station, planned_spots=i)
+
+    def export(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api_client.get('/api/import_export/entities/export/', params)
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content)
+        return content, len(queries)
+
+    def test_json_export(self):
+        self.add_campaigns(2)
+        content, small = self.export()
+        data = json.loads(content)
+        self.assertEqual(list(data), ['users', 'stations', 'clients', 'campaigns', 'analysts', 'assignments'])
+        self.assertEqual(data['clients'][0]['contract_value'], '1200.50')
+        self.assertEqual(data['campaigns'][0]['stations'], [self.station.id])
+        self.assertEqual(data['campaigns'][0]['client_name'], 'Backup Client')
+        self.assertEqual(data['assignments'][0]['analyst_user_full_name'], 'Ada Lee')
+        self.assertIn({'id': self.analyst.id, 'user_id': self.analyst_user.id}, data['analysts'])
+        # One query per section, however many rows there are
+        self.add_campaigns(20)
+        content, large = self.export()
+        self.assertEqual(len(json.loads(content)['assignments']), 22)
+        self.assertEqual(small, large)
+
+    def test_csv_export_restores(self):
+        self.add_campaigns(3)
+        content, _ = self.export(format='csv', chunk_size=2)
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[lines.index('[CAMPAIGNS]') + 1], 'id,client,name,description,created_at,status,client_name,stations')
+        Campaign.objects.all().delete()
+        upload = SimpleUploadedFile('backup.csv', content)
+        response = self.api_client.post('/api/import_export/entities/import/', {'file': upload, 'suppress_signals': '1'}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Assignment.objects.count(), 3)
+        self.assertEqual(list(Campaign.objects.get(name='Backup Camp 2').stations.all()), [self.station])
+        self.assertEqual(Station.objects.get().contacts, [{'name': 'Desk'}])
+        self.assertEqual(Client.objects.get().contract_value, Decimal('1200.50'))
+
+    def test_ndjson_export(self):
+        self.add_campaigns(1)
+        content, _ = self.export(format='ndjson')
+        records = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(records[-1]['section'], 'assignments')
+        self.assertEqual(records[-1]['data']['analyst_user'], 'backup_analyst')
+        response = self.api_client.get('/api/import_export/entities/export/', {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+class ImportParserTests(TestCase):
+    """Test the incremental upload parsers"""
+    def test_json_records_across_chunk_boundaries(self):
+        document = {
+            'meta': {'version': 2},
+            'users': [{'id': 1, 'username': 'ünï', 'is_active': True}, {'id': 2, 'username': 'b', 'score': 12345}],
+            'stations': [],
+            'clients': [{'id': 3, 'contacts': [{'name': 'x', 'phone': '1,2]'}]}],
+        }
+        upload = SimpleUploadedFile('backup.json', json.dumps(document, indent=2).encode('utf-8'))
+        records = list(iter_json_records(upload, chunk_size=3))
+        self.assertEqual(records, [
+            ('users', document['users'][0]),
+            ('users', document['users'][1]),
+            ('clients', document['clients'][0]),
+        ])
+
+    def test_truncated_json(self):
+        upload = SimpleUploadedFile('backup.json', b'{"users": [{"id": 1}, {"id": ')
+        with self.assertRaises(ValueError):
+            list(iter_json_records(upload, chunk_size=4))
+
+    def test_csv_and_ndjson_records(self):
+        csv_upload = SimpleUploadedFile('backup.csv', '﻿[CLIENTS]\r\nid,description\r\n4,"two\nlines"\r\n'.encode('utf-8'))
+        self.assertEqual(list(iter_csv_records(csv_upload)), [('clients', {'id': '4', 'description': 'two\nlines'})])
+        ndjson_upload = SimpleUploadedFile('backup.ndjson', b'{"section": "Stations", "data": {"id": 5}}\n\n')
+        self.assertEqual(list(iter_ndjson_records(ndjson_upload)), [('stations', {'id': 5})])
+
+    def test_malformed_uploads_are_rejected(self):
+        admin = User.objects.create_user(username='bad_importer', password='pass', is_staff=True)
+        api_client = APIClient()
+        api_client.force_authenticate(user=admin)
+        uploads = [
+            ('backup.csv', ('[CLIENTS]\r\nid,name\r\n1,' + 'x' * 200000 + '\r\n').encode('utf-8')),
+            ('backup.csv', '[CLIENTS]\r\nid,name\r\n1,Caf\xe9\r\n'.encode('latin-1')),
+            ('backup.json', '{"clients": [{"id": 1, "name": "Caf\xe9"}]}'.encode('latin-1')),
+        ]
+        for name, content in uploads:
+            response = api_client.post('/api/import_export/entities/import/', {'file': SimpleUploadedFile(name, content)}, format='multipart')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Import failed', response.json()['error'])
+        self.assertFalse(Client.objects.exists())
+
+class CursorPaginationTests(TestCase):
+    """Test opt-in keyset pagination on list endpoints"""
+    def setUp(self):
+        self.manager = User.objects.create_user(username='pager', password='pass', is_staff=True)
+        self.analyst_user = User.objects.create_user(username='paged_analyst', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.campaign = Campaign.objects.create(name='PagedCamp', client=Client.objects.create(name='PagedClient'))
+        self.assignments = [Assignment.objects.create(campaign=self.campaign, analyst=self.analyst) for _ in range(5)]
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.manager)
+
+    def test_unpaginated_by_default(self):
+        response = self.api_client.get('/api/assignments/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 5)
+        self.assertNotIn('X-Result-Limit', response)
+
+    def test_unpaginated_list_is_capped(self):
+        with mock.patch.object(AssignmentPagination, 'unpaginated_limit', 3):
+            response = self.api_client.get('/api/assignments/')
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response['X-Result-Limit'], '3')
+
+    def test_capped_thread_keeps_newest_messages(self):
+        other = User.objects.create_user(username='pen_pal', password='pass')
+        start = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            message = Message.objects.create(sender=self.manager, recipient=other, content=f'm{i}')
+            Message.objects.filter(pk=message.pk).update(timestamp=start + timedelta(minutes=i))
+        with mock.patch.object(TimestampPagination, 'unpaginated_limit', 3):
+            response = self.api_client.get('/api/messages/', {'participants_filter': f'{self.manager.id},{other.id}'})
+        self.assertEqual([row['content'] for row in response.data], ['m2', 'm3', 'm4'])
+        self.assertEqual(response['X-Result-Limit'], '3')
+        # Reference lists the frontend reads whole are not capped
+        for i in range(3):
+            Station.objects.create(name=f'Uncapped {i}')
+        response = self.api_client.get('/api/stations/')
+        self.assertEqual(len(response.data), 3)
+        self.assertNotIn('X-Result-Limit', response)
+
+    def test_cursor_pages(self):
+        response = self.api_client.get('/api/assignments/', {'page_size': 2})
+        seen = [row['id'] for row in response.data['results']]
+        while response.data['next']:
+            response = self.api_client.get(response.data['next'])
+            seen.extend(row['id'] for row in response.data['results'])
+        self.assertEqual(seen, sorted((a.id for a in self.assignments), reverse=True))
+
+class AssignmentListQueryCountTests(TestCase):
+    """Test that listing assignments costs a fixed number of queries"""
+    def setUp(self):
+        self.manager = User.objects.create_user(username='counter', password='pass', is_staff=True)
+        self.campaign = Campaign.objects.create(name='CountCamp', client=Client.objects.create(name='CountClient'))
+        self.station = Station.objects.create(name='Count FM')
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.manager)
+
+    def add_assignments(self, count):
+        for i in range(count):
+            user = User.objects.create_user(username=f'counted_{Assignment.objects.count()}', password='pass', first_name='Ana')
+            analyst, _ = MediaAnalystProfile.objects.get_or_create(user=user)
+            Assignment.objects.create(campaign=self.campaign, analyst=analyst, station=self.station)
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.api_client.get('/api/assignments/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data
+
+    def test_query_count_independent_of_rows(self):
+        self.add_assignments(2)
+        few, _ = self.list_queries()
+        self.add_assignments(6)
+        many, data = self.list_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(data), 8)
+        self.assertEqual(data[0]['analyst_user_full_name'], 'Ana')
+        self.assertTrue(data[0]['analyst_user'].startswith('counted_'))
+
+class AccountantCampaignQueryCountTests(TestCase):
+    """Test that the accountant campaign list computes completion dates in one pass"""
+    def setUp(self):
+        self.accountant = User.objects.create_user(username='accountant', password='pass')
+        self.accountant.groups.add(Group.objects.create(name='Accountants'))
+        self.client_obj = Client.objects.create(name='LedgerClient')
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.accountant)
+
+    def add_campaigns(self, count):
+        for i in range(count):
+            campaign = Campaign.objects.create(name=f'Ledger{i}', client=self.client_obj)
+            for day in (10, 20):
+                MonitoringPeriod.objects.create(
+                    campaign=campaign,
+                    monitoring_start=date(2025, 1, 1), monitoring_end=date(2025, 1, day),
+                    authentication_start=date(2025, 2, 1), authentication_end=date(2025, 2, day),
+                )
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.api_client.get('/api/accountant-campaigns/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data
+
+    def test_constant_query_count(self):
+        self.add_campaigns(1)
+        # The first request also loads the user's roles into the cache
+        self.list_queries()
+        few, _ = self.list_queries()
+        self.add_campaigns(4)
+        many, data = self.list_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(len(data), 5)
+        self.assertEqual(str(data[0]['anticipated_campaign_completion_date']), '2025-02-20')
+
+class MessageThreadTests(TestCase):
+    """Test that message threads are aggregated in the database"""
+    def setUp(self):
+        self.me = User.objects.create_user(username='inbox_owner', password='pass')
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        Message.objects.create(sender=self.me, recipient=self.alice, content='first')
+        Message.objects.create(sender=self.alice, recipient=self.me, content='reply one')
+        Message.objects.create(sender=self.alice, recipient=self.me, content='reply two', context='campaign-7')
+        Message.objects.create(sender=self.bob, recipient=self.me, content='hi')
+        Message.objects.create(sender=self.bob, recipient=self.me, content='latest from bob')
+        Message.objects.create(sender=self.alice, recipient=self.bob, content='not mine')
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.me)
+
+    def test_threads(self):
+        with self.assertNumQueries(1):
+            response = self.api_client.get('/api/messages/threads/')
+        threads = {t['id']: t for t in response.data}
+        self.assertEqual(list(threads), [f'{self.bob.id}:dashboard', f'{self.alice.id}:campaign-7', f'{self.alice.id}:dashboard'])
+        bob = threads[f'{self.bob.id}:dashboard']
+        self.assertEqual((bob['recipientName'], bob['lastMessage'], bob['unreadCount']), ('bob', 'latest from bob', 2))
+        self.assertEqual(threads[f'{self.alice.id}:dashboard']['lastMessage'], 'reply one')
+
+    def test_paginated_threads_and_mark_read(self):
+        response = self.api_client.post('/api/messages/threads/mark_read/', {'recipientId': self.bob.id}, format='json')
+        self.assertEqual(response.data['marked_read'], 2)
+        response = self.api_client.get('/api/messages/threads/', {'limit': 1})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['results'][0]['unreadCount'], 0)
+        self.assertIsNotNone(response.data['next'])
+
+class NotificationFanOutTests(TestCase):
+    """Test that submission notifications are queued once and fanned out with one bulk INSERT"""
+    def setUp(self):
+        self.managers = [User.objects.create_user(username=f'fanout_mgr{i}', password='pass', is_staff=True) for i in range(3)]
+        self.analyst_user = User.objects.create_user(username='fanout_analyst', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.campaign = Campaign.objects.create(name='FanCamp', client=Client.objects.create(name='FanClient'))
+        self.assignment = Assignment.objects.create(campaign=self.campaign, analyst=self.analyst)
+        drain_outbox()
+        Notification.objects.all().delete()
+
+    def test_single_insert_for_all_managers(self):
+        self.assignment.status = 'SUBMITTED'
+        with CaptureQueriesContext(connection) as ctx:
+            self.assignment.save()
+        # The save only queues one outbox row, whatever the number of managers
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "api_notification')]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn('api_notificationoutbox', inserts[0])
+        with CaptureQueriesContext(connection) as ctx:
+            stats = drain_outbox()
+        inserts = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "api_notification"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(stats['events'], 1)
+        self.assertEqual(stats['notifications'], len(self.managers))
+        for manager in self.managers:
+            self.assertTrue(Notification.objects.filter(user=manager, message__icontains='submitted').exists())
+        # The duplicate "status changed" handler is gone
+        self.assertFalse(Notification.objects.filter(user=self.analyst_user).exists())
+
+class StatusTrackingTests(TestCase):
+    """Test that status transitions are detected without re-reading the row"""
+    def setUp(self):
+        self.manager = User.objects.create_user(username='tracker_mgr', password='pass', is_staff=True)
+        self.analyst_user = User.objects.create_user(username='tracked', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.campaign = Campaign.objects.create(name='TrackCamp', client=Client.objects.create(name='TrackClient'))
+        self.assignment = Assignment.objects.create(campaign=self.campaign, analyst=self.analyst)
+
+    def test_no_select_of_saved_row(self):
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        assignment.status = 'SUBMITTED'
+        with CaptureQueriesContext(connection) as ctx:
+            assignment.save()
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'FROM "api_assignment"' in q['sql']]
+        self.assertEqual(selects, [])
+        drain_outbox()
+        self.assertTrue(Notification.objects.filter(user=self.manager, message__icontains='submitted').exists())
+
+    def test_unchanged_status_after_save(self):
+        self.assignment.status = 'APPROVED'
+        self.assignment.save()
+        drain_outbox()
+        Notification.objects.all().delete()
+        # Saving again without a status change must not notify again
+        self.assignment.memo = 'edited'
+        self.assignment.save()
+        drain_outbox()
+        self.assertFalse(Notification.objects.filter(message__icontains='approved').exists())
+
+    def test_deferred_status_falls_back_to_database(self):
+        Assignment.objects.filter(pk=self.assignment.pk).update(status='SUBMITTED')
+        assignment = Assignment.objects.only('id', 'campaign', 'analyst').get(pk=self.assignment.pk)
+        self.assertEqual(assignment.persisted_value('status'), 'SUBMITTED')
+
+    def test_refresh_from_db_updates_persisted_status(self):
+        Assignment.objects.filter(pk=self.assignment.pk).update(status='SUBMITTED')
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.persisted_value('status'), 'SUBMITTED')
+        campaign = Campaign.objects.get(pk=self.assignment.campaign_id)
+        campaign.status = 'CLOSED'
+        campaign.save()
+        Campaign.objects.filter(pk=campaign.pk).update(status='ACTIVE')
+        campaign.refresh_from_db(fields=['status'])
+        self.assertEqual(campaign.persisted_value('status'), 'ACTIVE')
+        NotificationOutbox.objects.all().delete()
+        # Closing again after the reopen is a change, so it notifies
+        campaign.status = 'CLOSED'
+        campaign.save()
+        self.assertTrue(NotificationOutbox.objects.filter(message__icontains='closed').exists())
+
+class AssignmentWorkflowTests(TestCase):
+    """Test the assignment status state machine"""
+    def setUp(self):
+        self.manager = User.objects.create_user(username='wf_mgr', password='pass', is_staff=True)
+        self.analyst_user = User.objects.create_user(username='wf_analyst', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.campaign = Campaign.objects.create(name='FlowCamp', client=Client.objects.create(name='FlowClient'))
+        self.assignment = Assignment.objects.create(campaign=self.campaign, analyst=self.analyst, status='SUBMITTED')
+        drain_outbox()
+        Notification.objects.all().delete()
+
+    def test_rejection_is_one_update(self):
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            transition_assignment(assignment, 'REJECTED', manager_comment='Redo it')
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "api_assignment"')]
+        self.assertEqual(len(updates), 1)
+        assignment.refresh_from_db()
+        # Never stored as REJECTED: the analyst gets it back as WIP right away
+        self.assertEqual(assignment.status, 'WIP')
+        self.assertEqual(assignment.manager_comment, 'Redo it')
+        drain_outbox()
+        self.assertTrue(Notification.objects.filter(user=self.analyst_user, message__icontains='rejected').exists())
+
+    def test_submit_sets_submitted_at(self):
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        transition_assignment(assignment, 'WIP')
+        transition_assignment(assignment, 'SUBMITTED')
+        assignment.refresh_from_db()
+        self.assertIsNotNone(assignment.submitted_at)
+        drain_outbox()
+        self.assertTrue(Notification.objects.filter(user=self.manager, message__icontains='submitted').exists())
+
+    def test_invalid_transition(self):
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        transition_assignment(assignment, 'APPROVED')
+        with self.assertRaises(InvalidTransition):
+            transition_assignment(assignment, 'SUBMITTED')
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.analyst_user)
+        response = api_client.patch(f'/api/assignments/{assignment.pk}/', {'status': 'SUBMITTED'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+class NotificationOutboxTests(TestCase):
+    """Test the transactional notification outbox"""
+    def setUp(self):
+        self.staff = User.objects.create_user(username='outbox_mgr', password='pass', is_staff=True)
+        self.user = User.objects.create_user(username='outbox_user', password='pass')
+        NotificationOutbox.objects.all().delete()
+
+    def test_rolled_back_change_queues_nothing(self):
+        try:
+            with transaction.atomic():
+                enqueue('Never sent', users=[self.user])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_drain_in_batches(self):
+        for i in range(3):
+            enqueue(f'Event {i}', users=[self.user, self.user.pk])
+        enqueue('Staff event', audience='staff')
+        self.assertEqual(drain_outbox(batch_size=2)['events'], 2)
+        stats = drain_outbox(batch_size=10)
+        self.assertEqual(stats['events'], 2)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        # Duplicate recipients are collapsed when queued
+        self.assertEqual(Notification.objects.filter(user=self.user, message__startswith='Event').count(), 3)
+        self.assertTrue(Notification.objects.filter(user=self.staff, message='Staff event').exists())
+        self.assertEqual(drain_outbox()['events'], 0)
+
+    def test_dispatch_command(self):
+        enqueue('From command', users=[self.user])
+        out = StringIO()
+        call_command('dispatch_notifications', '--once', stdout=out)
+        self.assertIn('Dispatched 1 event(s)', out.getvalue())
+        self.assertTrue(Notification.objects.filter(user=self.user, message='From command').exists())
+
+class WebSocketPushTests(TestCase):
+    """Test that new notifications and messages are pushed over the per-user socket"""
+    def setUp(self):
+        self.user = User.objects.create_user(username='socket_user', password='pass')
+        self.other = User.objects.create_user(username='socket_other', password='pass')
+        self.token = Token.objects.create(user=self.user)
+
+    async def connect(self, query):
+        communicator = WebsocketCommunicator(application, f'/ws/events/?{query}')
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    def commit(self, func, *args):
+        # TestCase never commits, so run the on_commit pushes explicitly
+        with self.captureOnCommitCallbacks(execute=True):
+            return func(*args)
+
+    async def test_rejects_missing_or_bad_token(self):
+        for query in ('', 'token=nope'):
+            communicator, connected, code = await self.connect(query)
+            self.assertFalse(connected)
+            self.assertEqual(code, 4401)
+
+    async def test_pushes_notifications_and_messages(self):
+        communicator, connected, _ = await self.connect(f'token={self.token.key}')
+        self.assertTrue(connected)
+        await sync_to_async(self.commit)(lambda: (enqueue('Pushed', users=[self.user, self.other]), drain_outbox()))
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['type'], 'notification')
+        self.assertEqual(event['data']['message'], 'Pushed')
+        self.assertEqual(event['data']['user'], self.user.id)
+        await sync_to_async(self.commit)(
+            lambda: Message.objects.create(sender=self.other, recipient=self.user, context='ctx', content='Hello')
+        )
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['data']['content'], 'Hello')
+        # Only the user's own events arrive
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.send_json_to({'type': 'ping'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'pong'})
+        await communicator.disconnect()
+
+    def test_unreachable_channel_layer_does_not_fail_writes(self):
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.other)
+        with mock.patch('channels.layers.InMemoryChannelLayer.group_send', side_effect=ConnectionError('layer down')), \
+                self.assertLogs('api.consumers', level='ERROR'):
+            response = self.commit(api_client.post, '/api/messages/', {'recipient': self.user.id, 'content': 'Still saved'}, 'json')
+            self.assertEqual(response.status_code, 201)
+            self.commit(lambda: (enqueue('Still sent', users=[self.user]), drain_outbox()))
+        self.assertEqual(Message.objects.filter(content='Still saved').count(), 1)
+        self.assertTrue(Notification.objects.filter(user=self.user, message='Still sent').exists())
+
+class UnreadCounterTests(TestCase):
+    """Test the maintained unread-notification counter"""
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='badge_user', password='pass')
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.user)
+
+    def badge(self):
+        return self.api_client.get('/api/notifications/unread_count/').json()['unread_count']
+
+    def test_counter_follows_creates_and_reads(self):
+        Notification.objects.create(user=self.user, message='Existing')
+        # Cold cache: counted once from the database, then served from the cache
+        self.assertEqual(self.badge(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.id), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('First', users=[self.user])
+            enqueue('Second', users=[self.user])
+            drain_outbox()
+        self.assertEqual(self.badge(), 3)
+        notification = Notification.objects.get(message='First')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_client.patch(f'/api/notifications/{notification.id}/', {'read': True}, format='json')
+        self.assertEqual(self.badge(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.filter(message='Second').delete()
+        self.assertEqual(self.badge(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_client.post('/api/notifications/mark_all_read/')
+        self.assertEqual(self.badge(), 0)
+        self.assertEqual(Notification.objects.filter(user=self.user, read=False).count(), 0)
+
+class RoleCacheTests(TestCase):
+    """Test that group membership is resolved once and invalidated on changes"""
+    def setUp(self):
+        cache.clear()
+        self.managers = Group.objects.create(name='Managers')
+        self.manager = User.objects.create_user(username='role_mgr', password='pass')
+        self.manager.groups.add(self.managers)
+        self.analyst_user = User.objects.create_user(username='role_analyst', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        campaign = Campaign.objects.create(name='RoleCamp', client=Client.objects.create(name='RoleClient'))
+        self.assignment = Assignment.objects.create(campaign=campaign, analyst=self.analyst)
+
+    def patch_as_manager(self):
+        # A fresh user object per request, as token authentication provides
+        api_client = APIClient()
+        api_client.force_authenticate(user=User.objects.get(pk=self.manager.pk))
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_client.patch(f'/api/assignments/{self.assignment.id}/', {'manager_comment': 'ok'}, format='json')
+        group_queries = [q['sql'] for q in ctx.captured_queries if 'auth_user_groups' in q['sql']]
+        return response, group_queries
+
+    def test_groups_loaded_once_then_cached(self):
+        response, group_queries = self.patch_as_manager()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(group_queries), 1)
+        response, group_queries = self.patch_as_manager()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(group_queries, [])
+
+    def test_membership_change_invalidates(self):
+        self.assertEqual(self.patch_as_manager()[0].status_code, 200)
+        self.managers.user_set.remove(self.manager)
+        self.assertEqual(self.patch_as_manager()[0].status_code, 403)
+        User.objects.get(pk=self.manager.pk).groups.add(self.managers)
+        self.assertEqual(self.patch_as_manager()[0].status_code, 200)
+        self.managers.user_set.clear()
+        self.assertEqual(self.patch_as_manager()[0].status_code, 403)
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test that token lookups are cached and revoked by signals"""
+    def setUp(self):
+        TOKEN_CACHE.clear()
+        cache.clear()
+        self.user = User.objects.create_user(username='token_user', password='pass', is_staff=True)
+        self.token = Token.objects.create(user=self.user)
+        self.api_client = APIClient()
+        self.api_client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.api_client.get('/api/auth/token-cache/')
+        token_queries = [q['sql'] for q in ctx.captured_queries if 'authtoken_token' in q['sql']]
+        return response, token_queries
+
+    def test_repeat_requests_skip_token_query(self):
+        response, token_queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(token_queries), 1)
+        response, token_queries = self.get()
+        self.assertEqual(token_queries, [])
+        stats = response.json()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['size'], 1)
+
+    def test_deleted_token_is_revoked(self):
+        self.assertEqual(self.get()[0].status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_deactivated_user_is_revoked(self):
+        self.assertEqual(self.get()[0].status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+    def test_expired_entry_is_reloaded(self):
+        self.get()
+        TOKEN_CACHE.entries[self.token.key] = (TOKEN_CACHE.entries[self.token.key][0], 0)
+        self.assertEqual(len(self.get()[1]), 1)
+
+class QueryIndexTests(TestCase):
+    """Test that the hot list queries are planned on the indexes added for them"""
+    def setUp(self):
+        self.user = User.objects.create_user(username='idx_user', password='pass')
+        self.other = User.objects.create_user(username='idx_other', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.user)
+        self.campaign = Campaign.objects.create(name='IdxCamp', client=Client.objects.create(name='IdxClient'))
+        if connection.vendor == 'postgresql':
+            # Test tables are tiny; make the planner show which index it would use
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, *names):
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in names), plan)
+
+    def test_notification_indexes(self):
+        self.assertUsesIndex(Notification.objects.filter(user=self.user).order_by('-timestamp'), 'notif_user_ts_idx')
+        self.assertUsesIndex(Notification.objects.filter(user=self.user, read=False).order_by('-timestamp'), 'notif_user_unread_idx')
+
+    def test_message_indexes(self):
+        thread = Message.objects.filter(sender=self.user, recipient=self.other, context='ctx').order_by('timestamp')
+        self.assertUsesIndex(thread, 'msg_thread_idx')
+        # mark_read on a thread
+        self.assertUsesIndex(Message.objects.filter(recipient=self.user, sender=self.other, context='ctx', read=False), 'msg_thread_idx', 'msg_unread_idx')
+        self.assertUsesIndex(Message.objects.filter(recipient=self.user, read=False).order_by('-timestamp'), 'msg_unread_idx')
+
+    def test_assignment_indexes(self):
+        self.assertUsesIndex(Assignment.objects.filter(analyst=self.analyst).order_by('-assigned_at'), 'assign_analyst_assigned_idx')
+        assigned_stations = Assignment.objects.filter(campaign=self.campaign).exclude(station__isnull=True).values_list('station_id', flat=True)
+        self.assertUsesIndex(assigned_stations, 'assign_campaign_station_idx')
+        self.assertUsesIndex(Assignment.objects.filter(status='SUBMITTED').order_by('due_date'), 'assign_status_due_idx')
+        overdue = Assignment.objects.filter(status='WIP', due_date__isnull=False, due_date__lt=date.today(), overdue_notified_at__isnull=True)
+        self.assertUsesIndex(overdue, 'assign_overdue_due_idx', 'assign_status_due_idx')
+
+class OverdueSweepTests(TestCase):
+    """Test that overdue notices come from the sweep, once per assignment"""
+    def setUp(self):
+        self.analyst_user = User.objects.create_user(username='late_analyst', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.campaign = Campaign.objects.create(name='LateCamp', client=Client.objects.create(name='LateClient'))
+        past = timezone.now().date() - timedelta(days=3)
+        self.late = [Assignment.objects.create(campaign=self.campaign, analyst=self.analyst, due_date=past) for _ in range(3)]
+        Assignment.objects.create(campaign=self.campaign, analyst=self.analyst, due_date=past, status='SUBMITTED')
+        Assignment.objects.create(campaign=self.campaign, analyst=self.analyst, due_date=timezone.now().date() + timedelta(days=3))
+        drain_outbox()
+        Notification.objects.all().delete()
+
+    def overdue_notices(self):
+        drain_outbox()
+        return Notification.objects.filter(user=self.analyst_user, message__icontains='overdue')
+
+    def test_saving_does_not_send_overdue_notices(self):
+        self.late[0].memo = 'still working'
+        self.late[0].save()
+        self.assertFalse(self.overdue_notices().exists())
+
+    def test_one_notice_per_assignment(self):
+        self.assertEqual(sweep_overdue_assignments(batch_size=2), 3)
+        self.assertEqual(self.overdue_notices().count(), 3)
+        self.assertEqual(sweep_overdue_assignments(), 0)
+        self.assertEqual(self.overdue_notices().count(), 3)
+        self.assertFalse(Assignment.objects.filter(pk__in=[a.pk for a in self.late], overdue_notified_at__isnull=True).exists())
+
+    def test_command(self):
+        out = StringIO()
+        call_command('sweep_overdue_assignments', '--once', stdout=out)
+        self.assertIn('Queued 3 overdue notice(s)', out.getvalue())
+
+class RetentionTests(TestCase):
+    """Test batched retention of notifications and messages"""
+    def setUp(self):
+        self.user = User.objects.create_user(username='retained', password='pass')
+        self.other = User.objects.create_user(username='retained_other', password='pass')
+        old = timezone.now() - timedelta(days=400)
+        for i in range(5):
+            Notification.objects.create(user=self.user, message=f'Old read {i}', read=True)
+        Notification.objects.create(user=self.user, message='Old unread')
+        Notification.objects.update(timestamp=old)
+        Notification.objects.create(user=self.user, message='Recent read', read=True)
+        Message.objects.create(sender=self.other, recipient=self.user, content='Old read', read=True)
+        Message.objects.create(sender=self.other, recipient=self.user, content='Old unread')
+        Message.objects.update(timestamp=old)
+
+    def test_deletes_in_batches(self):
+        with self.settings(RETENTION={'unread_notifications': {'days': None}}):
+            report = apply_retention(['read_notifications', 'unread_notifications'], batch_size=2)
+        self.assertEqual(report['read_notifications']['rows'], 5)
+        self.assertEqual(report['read_notifications']['batches'], 3)
+        self.assertEqual(report['unread_notifications']['rows'], 0)
+        self.assertEqual(sorted(Notification.objects.values_list('message', flat=True)), ['Old unread', 'Recent read'])
+        self.assertFalse(NotificationArchive.objects.exists())
+
+    def test_archives_messages(self):
+        with self.settings(RETENTION={'read_messages': {'days': 90, 'archive': True}}):
+            report = apply_retention(['read_messages'])
+        self.assertEqual(report['read_messages']['rows'], 1)
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['Old unread'])
+        archived = MessageArchive.objects.get()
+        self.assertEqual((archived.content, archived.sender_id, archived.recipient_id), ('Old read', self.other.id, self.user.id))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('apply_retention', '--once', '--policy', 'read_notifications', stdout=out)
+        self.assertIn('read_notifications: 5 row(s) deleted', out.getvalue())
+        out = StringIO()
+        call_command('apply_retention', '--dry-run', stdout=out)
+        # Unread notifications are only removed once an operator opts in
+        self.assertIn('unread_notifications: 0 row(s) expired', out.getvalue())
+
+    def test_batch_is_one_delete_and_adjusts_unread_counter(self):
+        cache.clear()
+        self.assertEqual(get_unread_count(self.user.id), 1)
+        with self.settings(RETENTION={'unread_notifications': {'days': 30, 'archive': False}}):
+            with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+                report = apply_retention(['unread_notifications'])
+        self.assertEqual(report['unread_notifications']['rows'], 1)
+        sql = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        # ids, recipients of the unread rows, one DELETE
+        self.assertEqual(len(sql), 3)
+        self.assertTrue(sql[2].startswith('DELETE FROM "api_notification"'))
+        self.assertEqual(get_unread_count(self.user.id), 0)
+        self.assertEqual(cache.get(unread_cache_key(self.user.id)), 0)
+
+class ResponseCacheTests(TestCase):
+    """Test the versioned response cache and ETags on reference data endpoints"""
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cache_user', password='pass', is_superuser=True)
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.user)
+        self.station = Station.objects.create(name='Cached FM')
+
+    def test_cached_list_and_etag(self):
+        first = self.api_client.get('/api/stations/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            second = self.api_client.get('/api/stations/')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], etag)
+        with self.assertNumQueries(0):
+            not_modified = self.api_client.get('/api/stations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        # Another query string is another entry
+        self.assertNotEqual(self.api_client.get('/api/stations/?page_size=1')['ETag'], etag)
+
+    def test_changes_bump_the_version(self):
+        etag = self.api_client.get('/api/stations/')['ETag']
+        self.api_client.post('/api/stations/', {'name': 'New FM'}, format='json')
+        response = self.api_client.get('/api/stations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        # Campaign responses also depend on stations (m2m) and client names
+        campaign = Campaign.objects.create(name='CacheCamp', client=Client.objects.create(name='Before'))
+        etag = self.api_client.get(f'/api/campaigns/{campaign.id}/')['ETag']
+        campaign.stations.add(self.station)
+        response = self.api_client.get(f'/api/campaigns/{campaign.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['stations'], [self.station.id])
+        campaign.client.name = 'After'
+        campaign.client.save()
+        self.assertEqual(self.api_client.get(f'/api/campaigns/{campaign.id}/').json()['client_name'], 'After')
+        # Deleting a station removes it from campaigns without m2m_changed
+        self.station.delete()
+        self.assertEqual(self.api_client.get(f'/api/campaigns/{campaign.id}/').json()['stations'], [])
+
+class AssignmentBulkCreateTests(TestCase):
+    """Test the batched assignment bulk_create action"""
+    def setUp(self):
+        self.manager = User.objects.create_user(username='bulk_mgr', password='pass', is_superuser=True)
+        self.analyst_user = User.objects.create_user(username='bulk_analyst', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.campaign = Campaign.objects.create(name='BulkCamp', client=Client.objects.create(name='BulkClient'))
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.manager)
+
+    def post(self, stations, **extra):
+        data = {'campaign': self.campaign.id, 'analyst': self.analyst.id, 'stations': stations, 'due_date': '2030-01-31', **extra}
+        return self.api_client.post('/api/assignments/bulk_create/', data, format='json')
+
+    def test_query_count_independent_of_stations(self):
+        few = [Station.objects.create(name=f'Few{i}').id for i in range(2)]
+        many = [Station.objects.create(name=f'Many{i}').id for i in range(30)]
+        self.post(few)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.post(few).status_code, 201)
+        with CaptureQueriesContext(connection) as large:
+            response = self.post(many)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 30)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(Assignment.objects.filter(station_id__in=many, due_date=date(2030, 1, 31)).count(), 30)
+        # One notification for the whole batch
+        NotificationOutbox.objects.all().delete()
+        self.post(many)
+        drain_outbox()
+        notices = Notification.objects.filter(user=self.analyst_user, message__icontains='30 new assignments')
+        self.assertEqual(notices.count(), 1)
+
+    def test_partial_errors(self):
+        station = Station.objects.create(name='Valid FM')
+        response = self.post([station.id, 999999, 'abc'])
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual([row['station'] for row in body['created']], [station.id])
+        self.assertEqual([error['station'] for error in body['errors']], ['abc', 999999])
+        response = self.post([station.id], analyst=999999)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['created'], [])
+        self.assertIn('analyst', response.json()['errors'][0]['errors'])
+
+class AssignmentBulkTransitionTests(TestCase):
+    """Test the bulk status transition action"""
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='bulk_approver', password='pass')
+        self.manager.groups.add(Group.objects.create(name='Managers'))
+        self.analyst_user = User.objects.create_user(username='bulk_submitter', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.campaign = Campaign.objects.create(name='MonthEnd', client=Client.objects.create(name='MonthClient'))
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.manager)
+
+    def submitted(self, count):
+        return [Assignment.objects.create(campaign=self.campaign, analyst=self.analyst, status='SUBMITTED').id for _ in range(count)]
+
+    def transition(self, ids, status, **extra):
+        return self.api_client.post('/api/assignments/bulk_transition/', {'ids': ids, 'status': status, **extra}, format='json')
+
+    def test_query_count_and_notifications(self):
+        self.transition(self.submitted(2), 'APPROVED')
+        few, many = self.submitted(2), self.submitted(25)
+        drain_outbox()
+        Notification.objects.all().delete()
+        with CaptureQueriesContext(connection) as small:
+            self.transition(few, 'APPROVED')
+        with CaptureQueriesContext(connection) as large:
+            response = self.transition(many, 'REJECTED', manager_comment='Redo')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 25)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(Assignment.objects.filter(pk__in=many, status='WIP', manager_comment='Redo').count(), 25)
+        drain_outbox()
+        notices = list(Notification.objects.filter(user=self.analyst_user).values_list('message', flat=True))
+        self.assertEqual(sorted(notices), [
+            '2 of your assignments for campaign MonthEnd have been approved',
+            '25 of your assignments for campaign MonthEnd have been rejected',
+        ])
+
+    def test_per_item_results(self):
+        approved = self.submitted(1)
+        self.transition(approved, 'APPROVED')
+        pending = self.submitted(1)
+        response = self.transition(pending + approved + [999999], 'SUBMITTED')
+        self.assertEqual(response.status_code, 207)
+        results = {result['id']: result for result in response.json()['results']}
+        self.assertTrue(results[pending[0]]['ok'])
+        self.assertIn('cannot move from APPROVED', results[approved[0]]['error'])
+        self.assertEqual(results[999999]['error'], 'Assignment not found.')
+
+    def test_managers_only(self):
+        self.api_client.force_authenticate(user=self.analyst_user)
+        self.assertEqual(self.transition(self.submitted(1), 'APPROVED').status_code, 403)
+        self.api_client.force_authenticate(user=self.manager)
+        self.assertEqual(self.transition([1], 'DONE').status_code, 400)
+
+class SparseFieldsetTests(TestCase):
+    """Test ?fields= / ?omit= on serializers and the trimmed queries behind them"""
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='sparse_mgr', password='pass', is_superuser=True)
+        self.analyst_user = User.objects.create_user(username='sparse_analyst', password='pass')
+        self.analyst, _ = MediaAnalystProfile.objects.get_or_create(user=self.analyst_user)
+        self.client_obj = Client.objects.create(name='SparseClient', description='Long text', contacts=[{'name': 'A'}])
+        self.station = Station.objects.create(name='Sparse FM', contacts=[{'name': 'B'}])
+        campaign = Campaign.objects.create(name='SparseCamp', client=self.client_obj)
+        Assignment.objects.create(campaign=campaign, analyst=self.analyst, station=self.station, memo='Long memo')
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.manager)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.api_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        table = url.split('/')[2].rstrip('s')
+        sql = [q['sql'] for q in ctx.captured_queries if f'FROM "api_{table}"' in q['sql']]
+        return response.json(), sql
+
+    def test_fields(self):
+        data, sql = self.get('/api/stations/?fields=id,name')
+        self.assertEqual(data, [{'id': self.station.id, 'name': 'Sparse FM'}])
+        self.assertNotIn('contacts', sql[0])
+        data, sql = self.get('/api/assignments/?fields=id,station,analyst_user')
+        self.assertEqual(data, [{'id': data[0]['id'], 'station': self.station.id, 'analyst_user': 'sparse_analyst'}])
+        self.assertNotIn('"memo"', sql[0])
+        self.assertNotIn('"api_campaign"', sql[0])
+
+    def test_omit(self):
+        data, sql = self.get('/api/clients/?omit=contacts,description')
+        self.assertNotIn('contacts', data[0])
+        self.assertNotIn('description', data[0])
+        self.assertEqual(data[0]['name'], 'SparseClient')
+        self.assertNotIn('"description"', sql[0])
+        data, _ = self.get('/api/assignments/?omit=memo,manager_comment')
+        self.assertNotIn('memo', data[0])
+        self.assertEqual(data[0]['analyst_user_id'], self.analyst_user.id)
+
+    def test_paginated_sparse_list(self):
+        response = self.api_client.get('/api/assignments/?fields=id&page_size=1')
+        self.assertEqual(response.json()['results'], [{'id': Assignment.objects.get().id}])
+
+class FastJSONTests(TestCase):
+    """Test the compact JSON renderer and parser used by the API and the exports"""
+    def setUp(self):
+        self.admin = User.objects.create_superuser('json_admin', 'json@test.com', 'pass')
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.admin)
+
+    def test_native_types_match_drf(self):
+        data = {'amount': Decimal('12.50'), 'at': datetime(2025, 3, 1, 9, 30, tzinfo=dt_timezone.utc), 'day': date(2025, 3, 1), 'name': 'Радио'}
+        expected = '{"amount":12.5,"at":"2025-03-01T09:30:00Z","day":"2025-03-01","name":"Радио"}'.encode()
+        self.assertEqual(dumps(data), expected)
+        self.assertEqual(FastJSONRenderer().render(data), expected)
+        with override_settings(FAST_JSON=False):
+            self.assertEqual(dumps(data), expected)
+
+    def test_api_round_trip(self):
+        response = self.api_client.post('/api/clients/', json.dumps({'name': 'JSONClient'}), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(b'"name":"JSONClient"', response.content)
+        response = self.api_client.post('/api/clients/', '{"name": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
+        # Indentation is still available on request
+        response = self.api_client.get('/api/clients/', HTTP_ACCEPT='application/json; indent=2')
+        self.assertIn(b'\n  {', response.content)
+
+    def test_exports_are_compact(self):
+        response = self.api_client.get('/api/import_export/analysis/export/')
+        self.assertEqual(response.content, b'[]')
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_json', rows=10, repeat=1, stdout=out)
+        self.assertIn('FastJSONRenderer', out.getvalue())
+        self.assertIn('campaign execution export (10 rows)', out.getvalue())
@@ -11,6 +11,7 @@ from .views import (
     MessageViewSet,
     register,
     CustomAuthToken,
+    token_cache_stats,
     AccountantCampaignViewSet, # Added AccountantCampaignViewSet
 )
 
@@ -39,6 +40,7 @@ from .import_export import (
 urlpatterns = [
     path('register/', register, name='api_register'),
     path('auth/token/', CustomAuthToken.as_view(), name='api_token_auth'),
+    path('auth/token-cache/', token_cache_stats, name='token_cache_stats'),
     # Import/Export APIs
     path('import_export/settings/export/', export_settings, name='export_settings'),
     path('import_export/settings/import/', import_settings, name='import_settings'),
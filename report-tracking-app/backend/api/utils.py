@@ -3,3 +3,6 @@ import datetime
 def export_filename(data_type, fmt):
     date_str = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
     return f"{data_type}_export_{date_str}.{fmt}"
+
+def is_truthy(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
@@ -1,11 +1,14 @@
 import logging
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User, Group
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When, Window
+from django.db.models.functions import Coalesce, NullIf, RowNumber, Substr
 from .models import Client, Station, Campaign, MonitoringPeriod, MediaAnalystProfile, Assignment, Notification, Message
 from .serializers import (
     ClientSerializer, StationSerializer, CampaignSerializer,
@@ -14,6 +17,13 @@ from .serializers import (
 )
 from .serializers_user import UserSerializer
 from .permissions import IsAdminOrManagerForEntities, IsAccountant, CanInteractWithMessages
+from .authentication import TOKEN_CACHE
+from .caching import CachedResponseMixin
+from .fieldsets import SparseFieldsViewMixin
+from .notifications import adjust_unread, enqueue, get_unread_count
+from .roles import frontend_role, is_admin_or_manager
+from .workflow import bulk_transition_assignments
+from .pagination import AssignmentPagination, TimestampPagination, CreatedAtPagination, ThreadPagination
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +34,7 @@ class UserViewSet(viewsets.ModelViewSet):
 class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
+    pagination_class = TimestampPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -32,47 +43,76 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all notifications as read for the current user."""
-        Notification.objects.filter(user=request.user, read=False).update(read=True)
+        # update() skips the model signals, so the badge counter is adjusted here
+        marked = Notification.objects.filter(user=request.user, read=False).update(read=True)
+        if marked:
+            transaction.on_commit(lambda: adjust_unread(request.user.id, -marked))
         return Response({'marked_all_read': True}, status=200)
 
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """Unread notification count for the badge, served from a maintained counter."""
+        return Response({'unread_count': get_unread_count(request.user.id)})
+
 class MessageViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='threads')
     def threads(self, request):
         """
         Returns a list of message threads for the current user.
-        Each thread is a unique (other user, context_id) pair.
+        Each thread is a unique (other user, context_id) pair, with its latest message and unread count.
+        Supports ?limit=&offset= pagination.
         """
         user = request.user
-        # Get all messages involving the user
-        messages = Message.objects.filter(Q(sender=user) | Q(recipient=user))
-        threads = {}
-        for msg in messages:
-            # Identify the other participant
-            if msg.sender == user:
-                other = msg.recipient
-            else:
-                other = msg.sender
-            context_id = msg.context or 'dashboard'
-            key = f"{other.id}:{context_id}"
-            # Only keep the latest message per thread
-            if key not in threads or msg.timestamp > threads[key]['lastTimestamp']:
-                threads[key] = {
-                    'id': key,
-                    'recipientId': other.id,
-                    'recipientName': other.username,
-                    'contextId': context_id,
-                    'title': other.username,
-                    'lastTimestamp': msg.timestamp,
-                }
-        # Sort threads by last message timestamp descending
-        thread_list = sorted(threads.values(), key=lambda t: t['lastTimestamp'], reverse=True)
-        for t in thread_list:
-            t.pop('lastTimestamp', None)
+        # Latest message per thread, picked in SQL with a window over (other participant, context)
+        other = Case(When(sender_id=user.id, then=F('recipient_id')), default=F('sender_id'))
+        thread_context = Coalesce(NullIf('context', Value('')), Value('dashboard'))
+        partition = [other, thread_context]
+        threads = Message.objects.filter(Q(sender=user) | Q(recipient=user)).annotate(
+            other_id=other,
+            other_name=Case(When(sender_id=user.id, then=F('recipient__username')), default=F('sender__username')),
+            thread_context=thread_context,
+            preview=Substr('content', 1, 120),
+            position=Window(RowNumber(), partition_by=partition, order_by=[F('timestamp').desc(), F('id').desc()]),
+            unread_count=Window(Count('id', filter=Q(recipient_id=user.id, read=False)), partition_by=partition),
+        ).filter(position=1).order_by('-timestamp', '-id').values(
+            'other_id', 'other_name', 'thread_context', 'preview', 'timestamp', 'sender_id', 'unread_count'
+        )
+        paginator = ThreadPagination()
+        page = paginator.paginate_queryset(threads, request, view=self)
+        thread_list = [{
+            'id': f"{t['other_id']}:{t['thread_context']}",
+            'recipientId': t['other_id'],
+            'recipientName': t['other_name'],
+            'contextId': t['thread_context'],
+            'title': t['other_name'],
+            'lastMessage': t['preview'],
+            'lastMessageFromMe': t['sender_id'] == user.id,
+            'lastTimestamp': t['timestamp'],
+            'unreadCount': t['unread_count'],
+        } for t in (page if page is not None else threads)]
+        if page is not None:
+            return paginator.get_paginated_response(thread_list)
         return Response(thread_list)
+
+    @action(detail=False, methods=['post'], url_path='threads/mark_read')
+    def mark_thread_read(self, request):
+        """Mark every message the current user received in one thread as read."""
+        other_id = request.data.get('recipientId')
+        context_id = request.data.get('contextId') or 'dashboard'
+        if not other_id:
+            return Response({'error': 'recipientId is required'}, status=400)
+        messages = Message.objects.filter(recipient=request.user, sender_id=other_id, read=False)
+        if context_id == 'dashboard':
+            messages = messages.filter(Q(context='') | Q(context='dashboard'))
+        else:
+            messages = messages.filter(context=context_id)
+        return Response({'marked_read': messages.update(read=True)})
+
     queryset = Message.objects.all().order_by('-timestamp') # Default ordering
     serializer_class = MessageSerializer
     permission_classes = [CanInteractWithMessages]
+    pagination_class = TimestampPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -127,6 +167,10 @@ class MessageViewSet(viewsets.ModelViewSet):
                 queryset = queryset.filter(context_id=context_id)
             return queryset.order_by('-timestamp').distinct()
 
+        # unread_only: unread messages received by the current user (message badge)
+        if self.request.query_params.get('unread_only') == 'true':
+            return Message.objects.filter(recipient=user, read=False).order_by('-timestamp')
+
         # Default behavior: Show messages involving the current user (sender or recipient)
         # This is the fallback if no other specific filters matched.
         queryset = Message.objects.filter(Q(sender=user) | Q(recipient=user))
@@ -140,21 +184,28 @@ class MessageViewSet(viewsets.ModelViewSet):
         # Automatically set the sender to the current user
         serializer.save(sender=self.request.user)
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(CachedResponseMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
+    cache_models = (Client,)
     from .permissions import IsAdminOrManagerForEntities
     permission_classes = [IsAdminOrManagerForEntities]  # Admins and Managers can create/edit/delete; all can view
 
-class StationViewSet(viewsets.ModelViewSet):
+class StationViewSet(CachedResponseMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Station.objects.all()
     serializer_class = StationSerializer
+    cache_models = (Station,)
+    pagination_class = CreatedAtPagination
     from .permissions import IsAdminOrManagerForEntities
     permission_classes = [IsAdminOrManagerForEntities]  # Admins and Managers can create/edit/delete; all can view
 
-class CampaignViewSet(viewsets.ModelViewSet):
+class CampaignViewSet(CachedResponseMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Campaign.objects.all()
     serializer_class = CampaignSerializer
+    # client_name comes from Client; stations changes bump Campaign through m2m_changed, but a
+    # deleted station leaves its campaigns through a cascade that sends no m2m_changed
+    cache_models = (Campaign, Client, Station)
+    pagination_class = CreatedAtPagination
     permission_classes = [IsAdminOrManagerForEntities]  # Admins and Managers can create/edit/delete; all can view
 
 class AccountantCampaignViewSet(viewsets.ReadOnlyModelViewSet):
@@ -166,16 +217,20 @@ class AccountantCampaignViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         # Filter for campaigns that are either ACTIVE or CLOSED
-        return Campaign.objects.filter(Q(status='ACTIVE') | Q(status='CLOSED')).select_related('client').order_by('-created_at')
+        return Campaign.objects.filter(Q(status='ACTIVE') | Q(status='CLOSED')).select_related('client').annotate(
+            anticipated_completion_date=Max('monitoring_periods__authentication_end')
+        ).order_by('-created_at')
 
 class MonitoringPeriodViewSet(viewsets.ModelViewSet):
     queryset = MonitoringPeriod.objects.all()
     serializer_class = MonitoringPeriodSerializer
 
-class MediaAnalystProfileViewSet(viewsets.ModelViewSet):
+class MediaAnalystProfileViewSet(CachedResponseMixin, viewsets.ModelViewSet):
 
     queryset = MediaAnalystProfile.objects.none()  # Needed for DRF router basename auto-detection
     serializer_class = MediaAnalystProfileSerializer
+    # Usernames and Analysts group membership come from User
+    cache_models = (MediaAnalystProfile, User)
 
     def get_queryset(self):
         # Only return MediaAnalystProfiles whose user is in the 'Analysts' group (plural)
@@ -200,7 +255,7 @@ class MediaAnalystProfileViewSet(viewsets.ModelViewSet):
 
 from .permissions import CanUpdateOwnAssignmentOrAdminManager
 
-class AssignmentViewSet(viewsets.ModelViewSet):
+class AssignmentViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     @action(detail=False, methods=["get"], url_path="assigned_stations")
     def assigned_stations(self, request):
         """
@@ -216,16 +271,42 @@ class AssignmentViewSet(viewsets.ModelViewSet):
 
     def update(self, request, *args, **kwargs):
         logger.info(f"[AssignmentViewSet][update] PUT/PATCH request for assignment {kwargs.get('pk')} by user {request.user.username}")
-        logger.info(f"[AssignmentViewSet][update] Data: {request.data}")
+        # Full payloads only at debug level; approvals arrive in long runs
+        logger.debug(f"[AssignmentViewSet][update] Data: {request.data}")
         response = super().update(request, *args, **kwargs)
-        logger.info(f"[AssignmentViewSet][update] Response data: {response.data}")
+        logger.debug(f"[AssignmentViewSet][update] Response data: {response.data}")
         return response
 
+    @action(detail=False, methods=["post"], url_path="bulk_transition")
+    def bulk_transition(self, request):
+        """
+        Apply one status change to many assignments (Admins/Managers).
+        Expects: {ids: [id, ...], status, manager_comment (optional)}
+        Returns {updated, results: [{id, ok, error?}, ...]}; 207 when some ids were rejected.
+        """
+        if not is_admin_or_manager(request.user):
+            return Response({"error": "Only Admins and Managers can change assignments in bulk."}, status=403)
+        ids = request.data.get("ids")
+        new_status = request.data.get("status")
+        manager_comment = request.data.get("manager_comment")
+        if not (isinstance(ids, list) and ids):
+            return Response({"error": "ids[] required"}, status=400)
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in ids))
+        except (TypeError, ValueError):
+            return Response({"error": "ids must be integers"}, status=400)
+        if new_status not in dict(Assignment.STATUS_CHOICES):
+            return Response({"error": f"status must be one of: {', '.join(dict(Assignment.STATUS_CHOICES))}"}, status=400)
+        results = bulk_transition_assignments(ids, new_status, manager_comment)
+        updated = sum(result["ok"] for result in results)
+        body = {"updated": updated, "results": results}
+        return Response(body, status=200 if updated == len(results) else 207)
+
     def partial_update(self, request, *args, **kwargs):
         logger.info(f"[AssignmentViewSet][partial_update] PATCH request for assignment {kwargs.get('pk')} by user {request.user.username}")
-        logger.info(f"[AssignmentViewSet][partial_update] Data: {request.data}")
+        logger.debug(f"[AssignmentViewSet][partial_update] Data: {request.data}")
         response = super().partial_update(request, *args, **kwargs)
-        logger.info(f"[AssignmentViewSet][partial_update] Response data: {response.data}")
+        logger.debug(f"[AssignmentViewSet][partial_update] Response data: {response.data}")
         return response
     def get_object(self):
         """
@@ -235,41 +316,30 @@ class AssignmentViewSet(viewsets.ModelViewSet):
         # Use the default lookup_field ('pk')
         lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
         lookup_value = self.kwargs.get(lookup_url_kwarg)
-        obj = Assignment.objects.get(pk=lookup_value)
+        obj = Assignment.objects.select_related('analyst__user').get(pk=lookup_value)
         self.check_object_permissions(self.request, obj)
         return obj
     queryset = Assignment.objects.all()
     permission_classes = [CanUpdateOwnAssignmentOrAdminManager]
     serializer_class = AssignmentSerializer
+    pagination_class = AssignmentPagination
 
     def get_queryset(self):
         user = self.request.user
-        print(f"[AssignmentViewSet] User: {user.username} (ID: {user.id}), Staff: {user.is_staff}, Superuser: {user.is_superuser}")
-
+        logger.debug(f"[AssignmentViewSet] User: {user.username} (ID: {user.id}), Staff: {user.is_staff}, Superuser: {user.is_superuser}")
+        # Everything the serializer touches comes back in the same query
+        assignments = Assignment.objects.select_related('analyst__user', 'campaign', 'station', 'monitoring_period')
 
         # Allow Admins and Managers (by group) to see all assignments
-        if (
-            user.is_staff or user.is_superuser or
-            user.groups.filter(name='Admins').exists() or
-            user.groups.filter(name='Managers').exists()
-        ):
-            print("[AssignmentViewSet] User is staff, superuser, admin, or manager. Querying all assignments.")
-            all_assignments = Assignment.objects.all()
-            print(f"[AssignmentViewSet] Found {all_assignments.count()} total assignments in DB via Assignment.objects.all().")
-            return all_assignments.order_by('-assigned_at')
+        if user.is_staff or is_admin_or_manager(user):
+            return assignments.order_by('-assigned_at')
 
         # Check for analyst profile and role if user is not staff/superuser
-
         analyst_profile = getattr(user, 'analyst_profile', None)
-        print(f"[AssignmentViewSet] analyst_profile: {analyst_profile}")
-
         if analyst_profile:
-            print(f"[AssignmentViewSet] User {user.username} is an analyst. Querying their assignments.")
-            user_assignments = Assignment.objects.filter(analyst=analyst_profile)
-            print(f"[AssignmentViewSet] Found {user_assignments.count()} assignments for analyst {user.username}.")
-            return user_assignments.order_by('-assigned_at')
+            return assignments.filter(analyst=analyst_profile).order_by('-assigned_at')
 
-        print(f"[AssignmentViewSet] User {user.username} is not staff, superuser, or designated analyst. Returning no assignments.")
+        logger.debug(f"[AssignmentViewSet] User {user.username} is not staff, superuser, or designated analyst. Returning no assignments.")
         return Assignment.objects.none() # Or return all if that's desired for other roles
 
     @action(detail=False, methods=["post"], url_path="bulk_create")
@@ -278,6 +348,9 @@ class AssignmentViewSet(viewsets.ModelViewSet):
         Create multiple assignments for one analyst/campaign, each for a different station.
         Expects: {campaign, analyst, stations: [id, ...], due_date, memo}
         At least one station is required.
+        The shared fields are validated once, stations with one query, and all rows are
+        inserted with one bulk_create; the analyst gets a single notification for the batch.
+        Responds 207 with {created, errors} when some stations are rejected.
         """
         campaign = request.data.get("campaign")
         analyst = request.data.get("analyst")
@@ -286,22 +359,43 @@ class AssignmentViewSet(viewsets.ModelViewSet):
         memo = request.data.get("memo", "")
         if not (campaign and analyst and stations and isinstance(stations, list) and len(stations) > 0):
             return Response({"error": "campaign, analyst, and at least one station[] required"}, status=400)
-        created = []
+        serializer = self.get_serializer(data={"campaign": campaign, "analyst": analyst, "due_date": due_date, "memo": memo})
+        if not serializer.is_valid():
+            # The shared fields are wrong, so every station fails the same way
+            errors = [{"station": st_id, "errors": serializer.errors} for st_id in stations]
+            return Response({"created": [], "errors": errors}, status=207)
+        shared = serializer.validated_data
+        station_field = serializer.fields["station"]
         errors = []
+        station_ids = []
         for st_id in stations:
-            data = {
-                "campaign": campaign,
-                "analyst": analyst,
-                "station": st_id,
-                "due_date": due_date,
-                "memo": memo,
-            }
-            serializer = self.get_serializer(data=data)
-            if serializer.is_valid():
-                serializer.save()
-                created.append(serializer.data)
-            else:
-                errors.append({"station": st_id, "errors": serializer.errors})
+            try:
+                station_ids.append(int(st_id))
+            except (TypeError, ValueError):
+                message = station_field.error_messages["incorrect_type"].format(data_type=type(st_id).__name__)
+                errors.append({"station": st_id, "errors": {"station": [message]}})
+        found = Station.objects.in_bulk(station_ids)
+        objs = []
+        for st_id in station_ids:
+            if st_id not in found:
+                message = station_field.error_messages["does_not_exist"].format(pk_value=st_id)
+                errors.append({"station": st_id, "errors": {"station": [message]}})
+                continue
+            objs.append(Assignment(station=found[st_id], **shared))
+        if objs:
+            with transaction.atomic():
+                Assignment.objects.bulk_create(objs)
+                analyst_profile = shared["analyst"]
+                campaign_obj = shared["campaign"]
+                count = len(objs)
+                enqueue(
+                    f"New assignment: Campaign {campaign_obj.name}" if count == 1
+                    else f"{count} new assignments: Campaign {campaign_obj.name}",
+                    users=[analyst_profile.user_id],
+                    link=f"/assignments?assignmentId={objs[0].id}",
+                    deadline_date=shared.get("due_date"),
+                )
+        created = self.get_serializer(objs, many=True).data
         if errors:
             return Response({"created": created, "errors": errors}, status=207)
         return Response(created, status=201)
@@ -340,20 +434,16 @@ def register(request):
     token, _ = Token.objects.get_or_create(user=user)
 
     # Normalize role for frontend UI
-    normalized_role = None
-    if user.is_superuser or user.groups.filter(name='Admins').exists():
-        normalized_role = 'admin'
-    elif user.groups.filter(name='Managers').exists():
-        normalized_role = 'manager'
-    elif user.groups.filter(name='Accountants').exists():
-        normalized_role = 'accountant'
-    elif user.groups.filter(name='Analysts').exists():
-        normalized_role = 'analyst'
-    else:
-        normalized_role = 'analyst'  # fallback
+    normalized_role = frontend_role(user)
 
     return Response({'token': token.key, 'username': user.username, 'role': normalized_role}, status=status.HTTP_201_CREATED)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def token_cache_stats(request):
+    """Hit/miss counters of this process's token authentication cache."""
+    return Response(TOKEN_CACHE.stats())
+
 from rest_framework.authtoken.views import ObtainAuthToken
 class CustomAuthToken(ObtainAuthToken):
     def post(self, request, *args, **kwargs):
@@ -362,14 +452,5 @@ class CustomAuthToken(ObtainAuthToken):
         user = serializer.validated_data['user']
         token, _ = Token.objects.get_or_create(user=user)
         # Normalize role for frontend UI
-        if user.is_superuser or user.groups.filter(name='Admins').exists():
-            role = 'admin'
-        elif user.groups.filter(name='Managers').exists():
-            role = 'manager'
-        elif user.groups.filter(name='Accountants').exists():
-            role = 'accountant'
-        elif user.groups.filter(name='Analysts').exists():
-            role = 'analyst'
-        else:
-            role = 'analyst'  # fallback
+        role = frontend_role(user)
         return Response({'token': token.key, 'username': user.username, 'role': role, 'user_id': user.id})
@@ -0,0 +1,191 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .notifications import enqueue, outbox_event
+
+OVERDUE_BATCH_SIZE = 500
+
+# Assignment status -> statuses it may move to
+ASSIGNMENT_TRANSITIONS = {
+    'WIP': {'SUBMITTED', 'APPROVED', 'REJECTED'},
+    'SUBMITTED': {'WIP', 'APPROVED', 'REJECTED'},
+    'APPROVED': {'WIP', 'REJECTED'},
+    # A rejection is stored as WIP; REJECTED only remains on rows saved before this workflow
+    'REJECTED': {'WIP', 'SUBMITTED', 'APPROVED'},
+}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def check_transition(old_status, new_status):
+    if old_status is None or old_status == new_status:
+        return
+    if new_status not in ASSIGNMENT_TRANSITIONS.get(old_status, ()):
+        raise InvalidTransition(f"An assignment cannot move from {old_status} to {new_status}.")
+
+
+def stored_status(requested_status):
+    # Rejected work goes straight back to the analyst
+    return 'WIP' if requested_status == 'REJECTED' else requested_status
+
+
+def prepare_transition(assignment):
+    """
+    Apply the side effects of a status change to the instance before it is written,
+    so the row, submitted_at and the WIP reset after a rejection go out in one UPDATE.
+    Records (old, requested) status on the instance for the post_save notifications.
+    """
+    old_status = assignment.persisted_value('status')
+    requested = assignment.status
+    assignment._transition = None
+    if assignment._state.adding or requested == old_status:
+        return
+    if requested == 'SUBMITTED' and not assignment.submitted_at:
+        assignment.submitted_at = timezone.now()
+    assignment.status = stored_status(requested)
+    assignment._transition = (old_status, requested)
+
+
+def send_transition_notifications(assignment, requested):
+    # Queued in the outbox, inside the same transaction as the status change
+    link = f"/assignments?assignmentId={assignment.id}"
+    campaign_name = assignment.campaign.name
+    if requested == 'SUBMITTED':
+        # Notify all staff managers with link to review
+        enqueue(
+            f"Assignment submitted by {assignment.analyst.user.username} for campaign {campaign_name}",
+            audience='staff', link=link, deadline_date=assignment.due_date
+        )
+    elif requested == 'APPROVED':
+        enqueue(f"Your assignment for campaign {campaign_name} has been approved", users=[assignment.analyst.user_id], link=link)
+    elif requested == 'REJECTED':
+        enqueue(f"Your assignment for campaign {campaign_name} has been rejected", users=[assignment.analyst.user_id], link=link)
+
+
+def transition_assignment(assignment, status, manager_comment=None):
+    """
+    Validate and apply a status change: one UPDATE of status, submitted_at and manager_comment,
+    with the resulting notifications queued in the same transaction.
+    """
+    check_transition(assignment.persisted_value('status'), status)
+    update_fields = ['status', 'submitted_at']
+    with transaction.atomic():
+        assignment.status = status
+        if manager_comment is not None:
+            assignment.manager_comment = manager_comment
+            update_fields.append('manager_comment')
+        assignment.save(update_fields=update_fields)
+    return assignment
+
+
+def sweep_overdue_assignments(batch_size=OVERDUE_BATCH_SIZE, today=None):
+    """
+    Queue one overdue notice for every WIP assignment past its due date that has not had one,
+    a batch per transaction. Rows are found with a range scan of the partial
+    assign_overdue_due_idx index and marked with overdue_notified_at. Returns the number swept.
+    """
+    from .models import Assignment, NotificationOutbox
+    today = today or timezone.localdate()
+    swept = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Assignment.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(status='WIP', due_date__isnull=False, due_date__lt=today, overdue_notified_at__isnull=True)
+                .select_related('campaign', 'analyst')
+                .order_by('due_date', 'id')[:batch_size]
+            )
+            if not batch:
+                return swept
+            NotificationOutbox.objects.bulk_create([
+                outbox_event(
+                    f"Assignment overdue for campaign {assignment.campaign.name}",
+                    users=[assignment.analyst.user_id],
+                    link=f"/assignments?assignmentId={assignment.id}",
+                    deadline_date=assignment.due_date,
+                )
+                for assignment in batch
+            ])
+            Assignment.objects.filter(pk__in=[assignment.pk for assignment in batch]).update(overdue_notified_at=timezone.now())
+        swept += len(batch)
+        if len(batch) < batch_size:
+            return swept
+
+
+def bulk_transition_notifications(rows, requested):
+    """
+    Outbox rows for a batch of transitions, one per recipient and campaign rather than one per
+    assignment. rows are dicts with campaign__name, analyst__user_id and analyst__user__username.
+    """
+    if requested == 'SUBMITTED':
+        counts = Counter((row['analyst__user__username'], row['campaign__name']) for row in rows)
+        return [
+            outbox_event(
+                f"Assignment submitted by {username} for campaign {campaign_name}" if count == 1
+                else f"{count} assignments submitted by {username} for campaign {campaign_name}",
+                audience='staff', link="/assignments",
+            )
+            for (username, campaign_name), count in counts.items()
+        ]
+    if requested not in ('APPROVED', 'REJECTED'):
+        return []
+    verb = requested.lower()
+    counts = Counter((row['analyst__user_id'], row['campaign__name']) for row in rows)
+    return [
+        outbox_event(
+            f"Your assignment for campaign {campaign_name} has been {verb}" if count == 1
+            else f"{count} of your assignments for campaign {campaign_name} have been {verb}",
+            users=[user_id], link="/assignments",
+        )
+        for (user_id, campaign_name), count in counts.items()
+    ]
+
+
+def bulk_transition_assignments(ids, status, manager_comment=None):
+    """
+    Apply one status change (and manager_comment) to many assignments: rows are read and locked
+    with one SELECT, every allowed transition is written with one UPDATE and the notifications
+    are queued with one bulk INSERT. Returns one {'id', 'ok'[, 'error']} result per requested id.
+    """
+    from .models import Assignment, NotificationOutbox
+    with transaction.atomic():
+        rows = {
+            row['id']: row for row in
+            Assignment.objects.select_for_update(of=('self',)).filter(pk__in=ids)
+            .values('id', 'status', 'campaign__name', 'analyst__user_id', 'analyst__user__username')
+        }
+        results = []
+        changed = []
+        for pk in ids:
+            row = rows.get(pk)
+            if row is None:
+                results.append({'id': pk, 'ok': False, 'error': 'Assignment not found.'})
+                continue
+            try:
+                check_transition(row['status'], status)
+            except InvalidTransition as e:
+                results.append({'id': pk, 'ok': False, 'error': str(e)})
+                continue
+            results.append({'id': pk, 'ok': True})
+            # Re-sending the current status updates the comment but notifies nobody
+            if row['status'] != status:
+                changed.append(row)
+        updates = {'status': stored_status(status)}
+        if status == 'SUBMITTED':
+            updates['submitted_at'] = Coalesce('submitted_at', timezone.now())
+        if manager_comment is not None:
+            updates['manager_comment'] = manager_comment
+        valid = [result['id'] for result in results if result['ok']]
+        # A comment goes on every accepted row; otherwise only rows whose status changes are written
+        if manager_comment is not None:
+            Assignment.objects.filter(pk__in=valid).update(**updates)
+        elif changed:
+            Assignment.objects.filter(pk__in=[row['id'] for row in changed]).update(**updates)
+        NotificationOutbox.objects.bulk_create(bulk_transition_notifications(changed, status))
+    return results
+
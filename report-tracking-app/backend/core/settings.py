@@ -36,6 +36,7 @@ ALLOWED_HOSTS = [
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # ASGI runserver, needed for WebSockets in development
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -45,17 +46,34 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',  # enable token authentication
     'corsheaders',
+    'channels',
     'api',
 ]
 
 # DRF settings: use token authentication
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication with an in-process cache of token -> user, see TOKEN_AUTH_CACHE
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # Compact JSON through orjson when it is installed, the standard library otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Keyset pagination, used when a client sends ?cursor= or ?page_size=
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.OptInCursorPagination',
+    'PAGE_SIZE': 50,
+    # Export endpoints use ?format=csv|json|ndjson for their own output, not for renderer selection
+    'URL_FORMAT_OVERRIDE': None,
 }
 
 MIDDLEWARE = [
@@ -96,6 +114,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 
 
@@ -108,6 +127,44 @@ DATABASES = {
     'default': dj_database_url.config(default=os.environ.get('DATABASE_URL'))
 }
 
+# Channel layer for WebSocket push and the shared cache (unread counters). Set REDIS_URL when
+# more than one process is running (web server and notification dispatcher); the in-memory
+# layer and local-memory cache only reach their own process.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        },
+    }
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+    # Share authenticated tokens between processes as well
+    TOKEN_AUTH_CACHE = {'SHARED_CACHE': 'default'}
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
+
+
+# Retention of notifications and messages (api.retention, manage.py apply_retention).
+# days: age after which rows leave the hot table (None keeps them); archive: copy them to the
+# *_archive tables first. Policies not listed keep their defaults. Unread notifications are
+# kept until an operator sets days for them.
+RETENTION = {
+    'read_notifications': {'days': 30, 'archive': False},
+    'unread_notifications': {'days': None, 'archive': True},
+    'read_messages': {'days': None, 'archive': True},
+}
+
+# API JSON is encoded with orjson when it is installed (api.renderers); False forces the standard library.
+FAST_JSON = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators